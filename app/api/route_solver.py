@@ -1,19 +1,129 @@
 """This module contains the routes for the puzzle solver."""
 
-from typing import Any
+# pylint: disable=too-many-arguments
+import asyncio
+import json
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
+from app.config import profiling_settings, solver_settings
+from app.db.database import async_session_maker
 from app.dependencies.core import DBSessionDep
-from app.dependencies.user import CurrentUserDep
-from app.orm import matrix as matrix_orm
-from app.puzzle_solver import FieldState, PuzzleGenerator, PuzzleSolver
-from app.schemas.matrix import CreateMatrix, ShowMatrix, SolveMatrix
+from app.dependencies.profiling import PROFILE_INLINE, ProfileDep
+from app.dependencies.user import CurrentUserDep, get_current_user
+from app.orm import matrix as matrix_orm, solution as solution_orm
+from app.puzzle_solver import FieldState, tasks
+from app.puzzle_solver.profiling import save_profile
+from app.schemas.matrix import (
+    CreateMatrix,
+    ShowMatrix,
+    SolveBatch,
+    SolveBatchItem,
+    SolveJobStatus,
+    SolveMatrix,
+)
+from app.workers import JobQueueFull, SolveJob, puzzle_pool, solve_jobs, solver_pool
 
 router = APIRouter(prefix="/api", tags=["puzzle_solver"])
 
 
+async def _solve_rows(
+    rows: List[List[int]],
+    db: Optional[AsyncSession] = None,
+    timeout: float = solver_settings.SOLVE_TIMEOUT,
+    cancel: Any = None,
+    progress: Any = None,
+    profile: bool = False,
+) -> Dict[str, Any]:
+    """Validate a board and solve it in the worker pool within the budget.
+
+    Repeats are answered from the pool cache first. Given a session, the
+    stored result is reused on a cache miss and a new result is stored. A
+    profiled solve always runs and carries its report under ``profile``.
+    """
+    result = FieldState.from_list_to_state(rows)
+    if not (state := result.get("state")):
+        return result
+    if not profile:
+        if (cached := solver_pool.cache.get(rows)) is not None:
+            return cached
+        if db is not None:
+            stored = await solution_orm.get_solution(rows, db)
+            if stored is not None:
+                solver_pool.cache.put(rows, stored)
+                return stored
+    result = await solver_pool.solve(
+        state,
+        timeout=timeout,
+        max_nodes=solver_settings.SOLVE_MAX_NODES,
+        cancel=cancel,
+        progress=progress,
+        profile=profile,
+        lookup=False,
+    )
+    if db is not None and not result.get("budget_exceeded"):
+        await solution_orm.create_solution(rows, result, db)
+    return result
+
+
+async def _save_profile(
+    kind: str, board: Any, report: Optional[Dict[str, Any]]
+) -> Dict[str, str]:
+    """Write a profile to the profile directory and return the path header."""
+    if report is None:
+        return {}
+    path = await asyncio.to_thread(
+        save_profile, profiling_settings.PROFILE_DIR, kind, board, report
+    )
+    return {"X-Profile-Path": path}
+
+
+def _profiled_response(
+    matrix: Any, report: Dict[str, Any], output: Optional[str], headers: Dict[str, str]
+) -> JSONResponse:
+    """Return a matrix with its profile inline or the path it was written to."""
+    content = ShowMatrix.model_validate(matrix, from_attributes=True).model_dump()
+    if output == PROFILE_INLINE:
+        content["profile"] = {
+            key: report[key] for key in ("seconds", "stats", "samples")
+        }
+    return JSONResponse(content, headers=headers)
+
+
+async def _solve_indexed(index: int, rows: List[List[int]]) -> Tuple[int, Dict]:
+    """Solve a board of a batch, keeping its position."""
+    return index, await _solve_rows(rows)
+
+
+async def _save_batch(
+    results: List[Tuple[int, Dict[str, Any]]], user_id: int, db: AsyncSession
+) -> List[SolveBatchItem]:
+    """Store the solved boards of a batch and build the per-board results."""
+    solved = [
+        (index, result["solved_puzzle"])
+        for index, result in results
+        if result.get("solved_puzzle")
+    ]
+    matrices = await matrix_orm.create_matrices(
+        [CreateMatrix(coordinates=board, user_id=user_id) for _, board in solved],
+        db=db,
+    )
+    ids = {index: matrix.id for (index, _), matrix in zip(solved, matrices)}
+    return [
+        SolveBatchItem(
+            index=index,
+            id=ids.get(index),
+            coordinates=result.get("solved_puzzle"),
+            error=result.get("error"),
+        )
+        for index, result in results
+    ]
+
+
 @router.post(
     "/solve",
     response_model=ShowMatrix,
@@ -23,19 +133,37 @@ async def solve_matrix(
     solve_matrix_schema: SolveMatrix,
     db: DBSessionDep,
     user: CurrentUserDep,
+    profile: ProfileDep,
 ) -> Any:
-    """Solve the matrix and return the solved puzzle."""
+    """Solve the matrix and return the solved puzzle.
+
+    An admin can profile the solve, see ``get_profile_output``. The profile
+    is written to the profile directory unless asked for inline, and the
+    path is returned in ``X-Profile-Path``, failed solves included.
+    """
     try:
-        result = FieldState.from_list_to_state(solve_matrix_schema.rows)
-        if state := result.get("state"):
-            solver = PuzzleSolver(state)
-            result = solver.solve()
-            solved_puzzle = result.get("solved_puzzle")
-            if solved_puzzle:
-                new_matrix = CreateMatrix(coordinates=solved_puzzle, user_id=user.id)
-                matrix = await matrix_orm.create_matrix(matrix_data=new_matrix, db=db)
-                return matrix
-        raise HTTPException(status_code=400, detail=result.get("error"))
+        rows = solve_matrix_schema.rows
+        result = await _solve_rows(rows, db, profile=profile is not None)
+        report = result.pop("profile", None)
+        headers = {}
+        if profile != PROFILE_INLINE or "solved_puzzle" not in result:
+            headers = await _save_profile("solve", rows, report)
+        if result.get("budget_exceeded"):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=result.get("error"),
+                headers=headers,
+            )
+        solved_puzzle = result.get("solved_puzzle")
+        if solved_puzzle:
+            new_matrix = CreateMatrix(coordinates=solved_puzzle, user_id=user.id)
+            matrix = await matrix_orm.create_matrix(matrix_data=new_matrix, db=db)
+            if report is not None:
+                return _profiled_response(matrix, report, profile, headers)
+            return matrix
+        raise HTTPException(
+            status_code=400, detail=result.get("error"), headers=headers
+        )
     except HTTPException as e:
         await db.rollback()
         raise e
@@ -44,25 +172,268 @@ async def solve_matrix(
         raise HTTPException(status_code=500, detail="Internal Server Error") from e
 
 
+@router.post(
+    "/solve/batch",
+    response_model=List[SolveBatchItem],
+    status_code=status.HTTP_200_OK,
+)
+async def solve_batch(
+    solve_batch_schema: SolveBatch,
+    db: DBSessionDep,
+    user: CurrentUserDep,
+) -> Any:
+    """Solve several boards in parallel and store the solved ones together."""
+    try:
+        results = await asyncio.gather(
+            *(
+                _solve_indexed(index, rows)
+                for index, rows in enumerate(solve_batch_schema.boards)
+            )
+        )
+        return await _save_batch(results, user.id, db)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error") from e
+
+
+@router.post("/solve/batch/stream", status_code=status.HTTP_200_OK)
+async def solve_batch_stream(
+    solve_batch_schema: SolveBatch,
+    user: CurrentUserDep,
+) -> StreamingResponse:
+    """Stream each board result as NDJSON as soon as it is solved.
+
+    Solved boards are stored together once the batch is done and the last
+    line lists the stored matrix ids in input order.
+    """
+    boards = solve_batch_schema.boards
+    user_id = user.id
+
+    async def stream_results() -> AsyncIterator[str]:
+        pending = [
+            asyncio.ensure_future(_solve_indexed(index, rows))
+            for index, rows in enumerate(boards)
+        ]
+        try:
+            results = []
+            for future in asyncio.as_completed(pending):
+                index, result = await future
+                results.append((index, result))
+                item = SolveBatchItem(
+                    index=index,
+                    coordinates=result.get("solved_puzzle"),
+                    error=result.get("error"),
+                )
+                yield item.model_dump_json() + "\n"
+            async with async_session_maker() as db:
+                results.sort(key=lambda item: item[0])
+                items = await _save_batch(results, user_id, db)
+            yield json.dumps({"ids": [item.id for item in items]}) + "\n"
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _result_event(result: Dict[str, Any], user_id: int, db: AsyncSession) -> str:
+    """Store a solved board and format the last event of a solve stream."""
+    if solved_puzzle := result.get("solved_puzzle"):
+        new_matrix = CreateMatrix(coordinates=solved_puzzle, user_id=user_id)
+        matrix = await matrix_orm.create_matrix(matrix_data=new_matrix, db=db)
+        return _sse_event(
+            "solution",
+            ShowMatrix.model_validate(matrix, from_attributes=True).model_dump(),
+        )
+    return _sse_event(
+        "error",
+        {
+            "error": result.get("error"),
+            "budget_exceeded": result.get("budget_exceeded"),
+        },
+    )
+
+
+@router.get("/solve/stream", status_code=status.HTTP_200_OK)
+async def solve_stream(rows: str, user: CurrentUserDep) -> StreamingResponse:
+    """Solve a board and stream its progress as Server-Sent Events.
+
+    ``rows`` is the board as a JSON array. ``progress`` events carry the
+    nodes searched, the search depth, the cells filled by propagation and
+    the partial board; the stream ends with a ``solution`` event holding
+    the stored matrix or an ``error`` event. Closing the stream cancels
+    the solve.
+    """
+    try:
+        board = SolveMatrix(rows=json.loads(rows)).rows
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid rows"
+        ) from e
+    user_id = user.id
+
+    async def stream_events() -> AsyncIterator[str]:
+        cancel = await solver_pool.cancel_event()
+        progress = await solver_pool.progress_queue()
+        async with async_session_maker() as db:
+            task = asyncio.ensure_future(
+                _solve_rows(
+                    board,
+                    db,
+                    timeout=solver_settings.SOLVE_JOB_TIMEOUT,
+                    cancel=cancel,
+                    progress=progress,
+                )
+            )
+            try:
+                interval = solver_settings.SOLVE_PROGRESS_INTERVAL
+                done: Set[Any] = set()
+                while not done:
+                    done, _ = await asyncio.wait({task}, timeout=interval)
+                    for report in await solver_pool.progress_reports(progress):
+                        yield _sse_event("progress", report)
+                yield await _result_event(task.result(), user_id, db)
+            finally:
+                task.cancel()
+                await solver_pool.set_event(cancel)
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+
+async def _run_job(job: SolveJob) -> None:
+    """Solve the board of a job with the longer job budget and store it."""
+    async with async_session_maker() as db:
+        job.result = await _solve_rows(
+            job.rows,
+            db,
+            timeout=solver_settings.SOLVE_JOB_TIMEOUT,
+            cancel=job.cancel,
+        )
+        if solved_puzzle := job.result.get("solved_puzzle"):
+            new_matrix = CreateMatrix(coordinates=solved_puzzle, user_id=job.user_id)
+            job.matrix = await matrix_orm.create_matrix(matrix_data=new_matrix, db=db)
+
+
+def _job_status(job: SolveJob) -> SolveJobStatus:
+    """Build the status of a job."""
+    return SolveJobStatus(
+        id=job.id,
+        status=job.status,
+        matrix=(
+            ShowMatrix.model_validate(job.matrix, from_attributes=True)
+            if job.matrix is not None
+            else None
+        ),
+        error=job.result.get("error"),
+        budget_exceeded=job.result.get("budget_exceeded"),
+    )
+
+
+@router.post(
+    "/solve/jobs",
+    response_model=SolveJobStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_solve_job(
+    solve_matrix_schema: SolveMatrix,
+    user: CurrentUserDep,
+) -> Any:
+    """Queue a board for solving in the background and return its job."""
+    rows = solve_matrix_schema.rows
+    if error := FieldState.from_list_to_state(rows).get("error"):
+        raise HTTPException(status_code=400, detail=error)
+    try:
+        job = await solve_jobs.submit(user.id, rows, _run_job)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many solve jobs",
+        ) from e
+    return _job_status(job)
+
+
+@router.get(
+    "/solve/jobs/{job_id}",
+    response_model=SolveJobStatus,
+    status_code=status.HTTP_200_OK,
+)
+async def get_solve_job(job_id: str, user: CurrentUserDep) -> Any:
+    """Return the status of a job and its matrix once solved."""
+    job = solve_jobs.get(job_id, user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(job)
+
+
+@router.delete(
+    "/solve/jobs/{job_id}",
+    response_model=SolveJobStatus,
+    status_code=status.HTTP_200_OK,
+)
+async def cancel_solve_job(job_id: str, user: CurrentUserDep) -> Any:
+    """Cancel a job that has not finished yet."""
+    job = await solve_jobs.cancel(job_id, user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(job)
+
+
 @router.get(
     "/generate",
     response_model=ShowMatrix,
     status_code=status.HTTP_200_OK,
 )
 async def generate_matrix(
-    size: int,
-    filled_percentage: float,
+    size: Annotated[int, Query(gt=0, le=solver_settings.GENERATE_MAX_SIZE)],
+    filled_percentage: Annotated[float, Query(gt=0, le=1)],
     db: DBSessionDep,
     user: CurrentUserDep,
+    profile: ProfileDep,
+    unique: bool = False,
 ) -> Any:
-    """Generate a new matrix."""
+    """Generate a new matrix.
+
+    With ``unique`` the puzzle has a single solution, keeping more clues
+    than ``filled_percentage`` when it has to. A profiled request, see
+    ``solve_matrix``, generates a fresh puzzle instead of a stocked one.
+    """
     try:
-        generator = PuzzleGenerator(size)
-        board = generator.generate_puzzle(filled_percentage)
+        if profile is None:
+            board = await puzzle_pool.get(size, filled_percentage, unique)
+        else:
+            board, report = await solver_pool.profile(
+                tasks.generate_board, size, filled_percentage, unique
+            )
+            board = tasks.unpack_board(board)
 
         new_matrix = CreateMatrix(coordinates=board, user_id=user.id)
         matrix = await matrix_orm.create_matrix(matrix_data=new_matrix, db=db)
+        if profile is not None:
+            request = {
+                "size": size,
+                "filled_percentage": filled_percentage,
+                "unique": unique,
+            }
+            headers = {}
+            if profile != PROFILE_INLINE:
+                headers = await _save_profile("generate", request, report)
+            return _profiled_response(matrix, report, profile, headers)
         return matrix
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail="Internal Server Error") from e
+
+
+@router.get(
+    "/generate/pool",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(get_current_user)],
+)
+async def generate_pool_stats() -> Dict[str, Any]:
+    """Return the depth and counters of the pre-generated puzzle stock."""
+    return puzzle_pool.stats()
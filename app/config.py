@@ -5,10 +5,10 @@ import os
 
 from dotenv import load_dotenv
 
-ENV = os.getenv('ENV', 'prod')
+ENV = os.getenv("ENV", "prod")
 
 # Set the path to the appropriate .env file
-if ENV == 'test':
+if ENV == "test":
     dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env.test")
 else:
     dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env")
@@ -44,5 +44,63 @@ class JWTTokenSettings:
     ALGORITHM: str = os.getenv("ALGORITHM")
 
 
+class SolverSettings:
+    """Settings for the puzzle solver."""
+
+    SOLVE_TIMEOUT: float = float(os.getenv("SOLVE_TIMEOUT", "10"))
+    SOLVE_MAX_NODES: int = int(os.getenv("SOLVE_MAX_NODES", "1000000"))
+    SOLVE_BATCH_LIMIT: int = int(os.getenv("SOLVE_BATCH_LIMIT", "100"))
+    SOLVE_MAX_SIZE: int = int(os.getenv("SOLVE_MAX_SIZE", "50"))
+    GENERATE_MAX_SIZE: int = int(os.getenv("GENERATE_MAX_SIZE", "30"))
+    SOLVE_CACHE_SIZE: int = int(os.getenv("SOLVE_CACHE_SIZE", "1024"))
+    SOLVE_CACHE_TTL: float = float(os.getenv("SOLVE_CACHE_TTL", "3600"))
+    SOLVE_TRANSPOSITION_SIZE: int = int(os.getenv("SOLVE_TRANSPOSITION_SIZE", "10000"))
+    SOLVE_PROGRESS_INTERVAL: float = float(os.getenv("SOLVE_PROGRESS_INTERVAL", "0.5"))
+    SOLVE_JOB_TIMEOUT: float = float(os.getenv("SOLVE_JOB_TIMEOUT", "300"))
+    SOLVE_JOB_WORKERS: int = int(os.getenv("SOLVE_JOB_WORKERS", "2"))
+    SOLVE_JOB_QUEUE_LIMIT: int = int(os.getenv("SOLVE_JOB_QUEUE_LIMIT", "20"))
+    SOLVE_JOB_TTL: float = float(os.getenv("SOLVE_JOB_TTL", "600"))
+    PUZZLE_POOL_BUCKETS: str = os.getenv("PUZZLE_POOL_BUCKETS", "6:0.5")
+    PUZZLE_POOL_LOW_WATERMARK: int = int(os.getenv("PUZZLE_POOL_LOW_WATERMARK", "2"))
+    PUZZLE_POOL_HIGH_WATERMARK: int = int(os.getenv("PUZZLE_POOL_HIGH_WATERMARK", "8"))
+    PUZZLE_POOL_MAX_BUCKETS: int = int(os.getenv("PUZZLE_POOL_MAX_BUCKETS", "32"))
+    PUZZLE_POOL_CONCURRENCY: int = int(os.getenv("PUZZLE_POOL_CONCURRENCY", "1"))
+    SOLVE_PARALLEL_MIN_SIZE: int = int(os.getenv("SOLVE_PARALLEL_MIN_SIZE", "15"))
+    SOLVE_PARALLEL_SPLIT: int = int(os.getenv("SOLVE_PARALLEL_SPLIT", "4"))
+    SOLVE_PARALLEL_DETERMINISTIC: bool = (
+        os.getenv("SOLVE_PARALLEL_DETERMINISTIC", "true").lower() == "true"
+    )
+    # Largest region without a clue; 0 lets it take the whole board.
+    SOLVE_FREE_VALUE_LIMIT: int = int(os.getenv("SOLVE_FREE_VALUE_LIMIT", "0"))
+    # Solving independent parts apart may return another first solution.
+    SOLVE_DECOMPOSE: bool = os.getenv("SOLVE_DECOMPOSE", "false").lower() == "true"
+    SOLVER_WORKERS: int = int(os.getenv("SOLVER_WORKERS", str(os.cpu_count() or 1)))
+
+
+class MetricsSettings:
+    """Settings for the Prometheus metrics."""
+
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Solver counters and phase timings kept in the solve statistics.
+    SOLVER_COUNTERS_ENABLED: bool = (
+        os.getenv("SOLVER_COUNTERS_ENABLED", "true").lower() == "true"
+    )
+
+
+class ProfilingSettings:
+    """Settings for profiling single requests."""
+
+    # Requests profile with this value in the X-Profile-Token header; empty
+    # disables profiling.
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_SAMPLE_INTERVAL: float = float(
+        os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005")
+    )
+
+
 db_settings = DBSettings()
 jwt_token_settings = JWTTokenSettings()
+solver_settings = SolverSettings()
+metrics_settings = MetricsSettings()
+profiling_settings = ProfilingSettings()
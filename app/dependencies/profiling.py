@@ -0,0 +1,40 @@
+"""Profiling dependencies."""
+
+import hmac
+from typing import Annotated, Optional
+
+from fastapi import Depends, Header, HTTPException, status
+
+from app.config import profiling_settings
+
+PROFILE_FILE = "file"
+PROFILE_INLINE = "inline"
+
+
+async def get_profile_output(
+    x_profile_token: Annotated[Optional[str], Header()] = None,
+    x_profile_output: Annotated[str, Header()] = PROFILE_FILE,
+) -> Optional[str]:
+    """Return where the profile of the request goes, or None to not profile.
+
+    Profiling is reserved to admins holding the configured token, sent in
+    ``X-Profile-Token``. ``X-Profile-Output`` is ``file`` to write it to the
+    profile directory or ``inline`` to return it with the response.
+    """
+    if x_profile_token is None:
+        return None
+    if not profiling_settings.PROFILE_TOKEN or not hmac.compare_digest(
+        x_profile_token.encode(), profiling_settings.PROFILE_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profile token"
+        )
+    if x_profile_output not in (PROFILE_FILE, PROFILE_INLINE):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="X-Profile-Output must be file or inline",
+        )
+    return x_profile_output
+
+
+ProfileDep = Annotated[Optional[str], Depends(get_profile_output)]
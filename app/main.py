@@ -2,17 +2,34 @@
 
 import logging
 import sys
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
-from app.api import route_auth, route_solver
-from app.config import project_settings
+from app.api import route_auth, route_metrics, route_solver
+from app.config import metrics_settings, project_settings
+from app.metrics import MetricsMiddleware
+from app.workers import puzzle_pool, solve_jobs, solver_pool
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
 
-app = FastAPI(docs_url="/api/docs", **project_settings)
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Start the worker pool and the puzzle producer with the app.
+
+    Unfinished solve jobs are cancelled on shutdown.
+    """
+    solver_pool.start()
+    puzzle_pool.start()
+    yield
+    await solve_jobs.stop()
+    await puzzle_pool.stop()
+    solver_pool.shutdown()
+
+
+app = FastAPI(docs_url="/api/docs", lifespan=lifespan, **project_settings)
 
 
 @app.get("/")
@@ -31,3 +48,7 @@ app.add_middleware(
 
 app.include_router(route_auth.router)
 app.include_router(route_solver.router)
+
+if metrics_settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(route_metrics.router)
@@ -0,0 +1,150 @@
+"""Prometheus metrics rendered in the text exposition format."""
+
+# pylint: disable=too-few-public-methods,too-many-arguments
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import metrics_settings
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Histogram of observations with cumulative buckets per label set."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        enabled: bool = True,
+    ):
+        """Initialize an empty histogram; a disabled one ignores observations."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.enabled = enabled
+        self.samples: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: object) -> None:
+        """Record an observation for the label values, in ``labelnames`` order."""
+        if not self.enabled:
+            return
+        key = tuple(str(label) for label in labels)
+        if key not in self.samples:
+            self.samples[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.samples[key]
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[position] += 1
+                break
+        else:
+            counts[-1] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, *labels: object) -> Iterator[None]:
+        """Observe the wall time of a block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of the histogram."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, (counts, total) in sorted(self.samples.items()):
+            labels = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labelnames, key)
+            ]
+            cumulative = 0
+            bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total[0]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing the latency of every HTTP request.
+
+    Requests are labelled by the path template of the matched route, so
+    path parameters do not grow the number of series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        """Wrap an ASGI app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            request_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+            )
+
+
+def render_metrics() -> str:
+    """Render every metric in the text exposition format."""
+    lines = []
+    for histogram in (request_seconds, solve_seconds, db_seconds):
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route.",
+    ("method", "route", "status"),
+    enabled=metrics_settings.METRICS_ENABLED,
+)
+solve_seconds = Histogram(
+    "solver_solve_duration_seconds",
+    "Wall time of solves in the worker pool by board size.",
+    ("size", "outcome"),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+    enabled=metrics_settings.METRICS_ENABLED,
+)
+db_seconds = Histogram(
+    "db_query_duration_seconds",
+    "Latency of database writes by operation.",
+    ("operation",),
+    enabled=metrics_settings.METRICS_ENABLED,
+)
@@ -1,8 +1,10 @@
 """Import module"""
 
-__all__ = ("Base", "Matrix", "User")
+__all__ = ("Base", "Board", "Matrix", "Solution", "User")
 
 
 from app.models.base_class import Base
+from app.models.board import Board
 from app.models.matrix import Matrix
+from app.models.solution import Solution
 from app.models.user import User
@@ -0,0 +1,17 @@
+"""This module contains the Board model."""
+
+# pylint: disable=too-few-public-methods
+from typing import List
+
+from sqlalchemy import JSON, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base_class import Base
+
+
+class Board(Base):
+    """Board stored once and addressed by the hash of its cells."""
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    hash: Mapped[str] = mapped_column(String(64), index=True, unique=True)
+    coordinates: Mapped[List[List[int]]] = mapped_column(JSON, nullable=False)
@@ -1,23 +1,39 @@
 """This module contains the Matrix model."""
 
 # pylint: disable=too-few-public-methods
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional
 
 from sqlalchemy import JSON, ForeignKey, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.base_class import Base
+from app.models.board import Board
 
 if TYPE_CHECKING:
     from .user import User
 
 
 class Matrix(Base):
-    """Matrix model."""
+    """Matrix model.
+
+    New rows reference a shared ``Board``; rows created before boards were
+    stored separately keep their coordinates inline.
+    """
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    coordinates: Mapped[List[List[int]]] = mapped_column(
-        JSON, unique=False, nullable=False
+    stored_coordinates: Mapped[Optional[List[List[int]]]] = mapped_column(
+        "coordinates", JSON, unique=False, nullable=True
+    )
+    board_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("board.id"), nullable=True
     )
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
+    board: Mapped[Optional[Board]] = relationship(Board, lazy="joined")
     user: Mapped["User"] = relationship("User", back_populates="matrices")
+
+    @property
+    def coordinates(self) -> List[List[int]]:
+        """Return the board of the matrix."""
+        if self.board is not None:
+            return self.board.coordinates
+        return self.stored_coordinates
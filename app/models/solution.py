@@ -0,0 +1,22 @@
+"""This module contains the Solution model."""
+
+# pylint: disable=too-few-public-methods
+from typing import Optional
+
+from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.models.base_class import Base
+from app.models.board import Board
+
+
+class Solution(Base):
+    """Result of solving a board, keyed by the hash of the input board."""
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    board_hash: Mapped[str] = mapped_column(String(64), index=True, unique=True)
+    board_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("board.id"), nullable=True
+    )
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    board: Mapped[Optional[Board]] = relationship(Board, lazy="joined")
@@ -0,0 +1,55 @@
+"""Board ORM functions."""
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.board import Board
+from app.puzzle_solver.cache import board_hash
+
+
+async def get_boards(digests: Iterable[str], db: AsyncSession) -> Dict[str, Board]:
+    """Get the stored boards with the given hashes."""
+    query = select(Board).filter(Board.hash.in_(set(digests)))
+    result = await db.scalars(query)
+    return {board.hash: board for board in result}
+
+
+async def get_or_create_boards(
+    boards: List[List[List[int]]], db: AsyncSession
+) -> List[Board]:
+    """Get the stored boards with these cells, storing the new ones together.
+
+    The new boards are inserted in one statement that skips the ones a
+    concurrent request stored in the meantime, and all of them are read
+    back, whoever stored them.
+    """
+    digests = [board_hash(coordinates) for coordinates in boards]
+    stored = await get_boards(digests, db)
+    missing = {
+        digest: coordinates
+        for digest, coordinates in zip(digests, boards)
+        if digest not in stored
+    }
+    if missing:
+        # Sorted by hash so concurrent batches lock the rows in one order.
+        await db.execute(
+            insert(Board)
+            .values(
+                [
+                    {"hash": digest, "coordinates": coordinates}
+                    for digest, coordinates in sorted(missing.items())
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["hash"])
+        )
+        stored.update(await get_boards(missing, db))
+    return [stored[digest] for digest in digests]
+
+
+async def get_or_create_board(coordinates: List[List[int]], db: AsyncSession):
+    """Get the stored board with these cells, storing it if it is new."""
+    (board,) = await get_or_create_boards([coordinates], db)
+    return board
@@ -1,20 +1,37 @@
 """Matrix ORM functions."""
 
-from sqlalchemy import insert
+from typing import List
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.metrics import db_seconds
 from app.models.matrix import Matrix
+from app.orm.board import get_or_create_board, get_or_create_boards
 from app.schemas.matrix import CreateMatrix
 
 
 async def create_matrix(matrix_data: CreateMatrix, db: AsyncSession):
-    """Create a new matrix."""
-    query = (
-        insert(Matrix)
-        .values(coordinates=matrix_data.coordinates, user_id=matrix_data.user_id)
-        .returning(Matrix)
-    )
-    result = await db.execute(query)
-    created_matrix = result.scalar()
-    await db.commit()
+    """Create a new matrix referencing its stored board."""
+    with db_seconds.time("create_matrix"):
+        board = await get_or_create_board(matrix_data.coordinates, db)
+        created_matrix = Matrix(board=board, user_id=matrix_data.user_id)
+        db.add(created_matrix)
+        await db.commit()
     return created_matrix
+
+
+async def create_matrices(matrices: List[CreateMatrix], db: AsyncSession):
+    """Create several matrices, inserting the rows and new boards in bulk."""
+    if not matrices:
+        return []
+    with db_seconds.time("create_matrices"):
+        boards = await get_or_create_boards(
+            [matrix.coordinates for matrix in matrices], db
+        )
+        created_matrices = [
+            Matrix(board=board, user_id=matrix.user_id)
+            for board, matrix in zip(boards, matrices)
+        ]
+        db.add_all(created_matrices)
+        await db.commit()
+    return created_matrices
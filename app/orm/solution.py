@@ -0,0 +1,45 @@
+"""Solution ORM functions."""
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.solution import Solution
+from app.orm.board import get_or_create_board
+from app.puzzle_solver.cache import board_hash
+
+
+async def get_solution(
+    rows: List[List[int]], db: AsyncSession
+) -> Optional[Dict[str, Any]]:
+    """Get the stored result of solving a board as a solver result."""
+    query = select(Solution).filter(Solution.board_hash == board_hash(rows))
+    solution = await db.scalar(query)
+    if solution is None:
+        return None
+    if solution.board is not None:
+        return {"solved_puzzle": solution.board.coordinates}
+    return {"error": solution.error}
+
+
+async def create_solution(
+    rows: List[List[int]], result: Dict[str, Any], db: AsyncSession
+):
+    """Store the result of solving a board, keeping an existing one.
+
+    Returns None when the board already had a result; the board of the
+    solution is committed either way.
+    """
+    solution = Solution(board_hash=board_hash(rows), error=result.get("error"))
+    if solved_puzzle := result.get("solved_puzzle"):
+        solution.board = await get_or_create_board(solved_puzzle, db)
+    created = True
+    try:
+        async with db.begin_nested():
+            db.add(solution)
+    except IntegrityError:
+        created = False
+    await db.commit()
+    return solution if created else None
@@ -1,6 +1,14 @@
 """Init module."""
 
+from .cache import SolutionCache
 from .puzzle_generator import PuzzleGenerator
-from .solver import FieldState, PuzzleSolver
+from .solver import FieldState, PuzzleSolver, SolveBudgetExceeded, TranspositionTable
 
-__all__ = ["PuzzleGenerator", "FieldState", "PuzzleSolver"]
+__all__ = [
+    "PuzzleGenerator",
+    "FieldState",
+    "PuzzleSolver",
+    "SolutionCache",
+    "SolveBudgetExceeded",
+    "TranspositionTable",
+]
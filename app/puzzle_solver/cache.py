@@ -0,0 +1,139 @@
+"""Solution cache keyed by boards up to rotation and reflection.
+
+A board and its 7 rotated or mirrored images share one entry. Each entry
+is stored in the canonical orientation, the lexicographically smallest of
+the 8 images, and mapped back through the transform of the board asked for.
+"""
+
+import functools
+import hashlib
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+@functools.lru_cache(maxsize=None)
+def dihedral_permutations(size: int) -> Tuple[Tuple[int, ...], ...]:
+    """Return the index permutations of the 8 symmetries of a square board.
+
+    Cell ``i`` of the transformed board is cell ``permutation[i]`` of the
+    original, both indexed as ``x * size + y``.
+    """
+    last = size - 1
+    maps = (
+        lambda x, y: (x, y),
+        lambda x, y: (y, last - x),
+        lambda x, y: (last - x, last - y),
+        lambda x, y: (last - y, x),
+        lambda x, y: (x, last - y),
+        lambda x, y: (last - x, y),
+        lambda x, y: (y, x),
+        lambda x, y: (last - y, last - x),
+    )
+    return tuple(
+        tuple(
+            source_x * size + source_y
+            for source_x, source_y in (
+                transform(x, y) for x in range(size) for y in range(size)
+            )
+        )
+        for transform in maps
+    )
+
+
+def board_hash(matrix: List[List[int]]) -> str:
+    """Return the hash addressing a board by its cells."""
+    return hash_cells([value for row in matrix for value in row])
+
+
+def hash_cells(cells: Sequence[int]) -> str:
+    """Return the SHA-256 hex digest of flattened board cells."""
+    return hashlib.sha256(array("I", cells).tobytes()).hexdigest()
+
+
+def canonical_board(matrix: List[List[int]]) -> Tuple[str, Tuple[int, ...]]:
+    """Return the canonical hash of a board and the permutation reaching it."""
+    cells = [value for row in matrix for value in row]
+    images = (
+        ([cells[index] for index in permutation], permutation)
+        for permutation in dihedral_permutations(len(matrix))
+    )
+    image, permutation = min(images, key=lambda item: item[0])
+    return hash_cells(image), permutation
+
+
+def to_canonical(matrix: List[List[int]], permutation: Sequence[int]) -> List[int]:
+    """Flatten a board into its canonical orientation."""
+    cells = [value for row in matrix for value in row]
+    return [cells[index] for index in permutation]
+
+
+def from_canonical(cells: Sequence[int], permutation: Sequence[int]) -> List[List[int]]:
+    """Rebuild a board in its original orientation from canonical cells."""
+    size = len(permutation)
+    original = [0] * size
+    for position, index in enumerate(permutation):
+        original[index] = cells[position]
+    width = round(size**0.5)
+    return [original[row : row + width] for row in range(0, size, width)]
+
+
+class SolutionCache:
+    """LRU cache of solve results with size and TTL eviction."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """Initialize the cache; ``max_size`` of 0 disables it."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, matrix: List[List[int]]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a board or any of its images."""
+        if self.max_size <= 0:
+            return None
+        key, permutation = canonical_board(matrix)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        result = dict(entry[1])
+        if "solved_puzzle" in result:
+            result["solved_puzzle"] = from_canonical(
+                result["solved_puzzle"], permutation
+            )
+        return result
+
+    def put(self, matrix: List[List[int]], result: Dict[str, Any]) -> None:
+        """Store the result of solving a board."""
+        if self.max_size <= 0:
+            return
+        key, permutation = canonical_board(matrix)
+        result = dict(result)
+        if "solved_puzzle" in result:
+            result["solved_puzzle"] = to_canonical(result["solved_puzzle"], permutation)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (expires, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit and miss counters and the current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
@@ -0,0 +1,124 @@
+"""Profiling of single solver calls with cProfile and a sampling timer.
+
+Profiles are taken where the call runs, worker processes included, and
+travel back as plain data so the caller can store or return them.
+"""
+
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Seconds between two stack samples.
+SAMPLE_INTERVAL = 0.005
+
+# Functions listed in the text summary of the cProfile stats.
+STATS_LIMIT = 40
+
+
+class StackSampler:
+    """Samples the stack of a thread at a fixed interval from a helper thread.
+
+    Samples are counted as folded stacks, ``outer;inner`` frames as
+    ``file:function``, the input format of flame graph tools.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """Initialize a stopped sampler."""
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._thread_id = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start sampling the calling thread."""
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self) -> List[str]:
+        """Return the folded stacks with their counts, most frequent first."""
+        return [f"{stack} {count}" for stack, count in self.samples.most_common()]
+
+    def _sample(self) -> None:
+        """Record a stack of the sampled thread every interval."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(  # pylint: disable=protected-access
+                self._thread_id
+            )
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+def profile_call(
+    func: Callable[..., Any], interval: float, *args: Any
+) -> Tuple[Any, Dict[str, Any]]:
+    """Call a function under cProfile and the sampler.
+
+    Returns the result and a report with the wall time, the marshalled
+    cProfile stats, their text summary and the folded stack samples.
+    """
+    profiler = cProfile.Profile()
+    sampler = StackSampler(interval)
+    sampler.start()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+        seconds = time.perf_counter() - started
+        sampler.stop()
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats("cumulative").print_stats(STATS_LIMIT)
+    return result, {
+        "seconds": seconds,
+        "pstats": marshal.dumps(stats.stats),
+        "stats": summary.getvalue(),
+        "samples": sampler.folded(),
+    }
+
+
+def save_profile(directory: str, kind: str, board: Any, report: Dict[str, Any]) -> str:
+    """Write a profile and its input to a new directory and return its path.
+
+    The directory holds the input as ``input.json``, the cProfile stats as
+    ``profile.pstats`` (readable with ``pstats`` or snakeviz), their text
+    summary and the folded samples.
+    """
+    path = os.path.join(
+        directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:8]}"
+    )
+    os.makedirs(path)
+    with open(os.path.join(path, "input.json"), "w", encoding="utf-8") as file:
+        json.dump({"kind": kind, "input": board, "seconds": report["seconds"]}, file)
+    with open(os.path.join(path, "profile.pstats"), "wb") as file:
+        file.write(report["pstats"])
+    with open(os.path.join(path, "stats.txt"), "w", encoding="utf-8") as file:
+        file.write(report["stats"])
+    with open(os.path.join(path, "samples.folded"), "w", encoding="utf-8") as file:
+        file.write("\n".join(report["samples"]) + "\n")
+    return path
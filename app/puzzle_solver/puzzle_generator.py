@@ -1,23 +1,59 @@
 """Puzzle generator."""
 
 import random
-from typing import List
+from typing import List, Optional, Sequence, Set
 
-from .solver import FieldState, PuzzleSolver
+from .solver import (
+    FREE_VALUE_LIMIT,
+    FieldState,
+    PuzzleSolver,
+    SolveBudgetExceeded,
+    TranspositionTable,
+    neighbour_table,
+)
+
+# Relative weights of the region sizes 1..9 drawn while growing. Larger
+# sizes, allowed by a free value limit above 9, halve the weight of the size
+# before them from LARGE_REGION_WEIGHT on, so they stay rare but uncapped.
+REGION_SIZE_WEIGHTS = (3, 4, 4, 4, 3, 3, 2, 2, 2)
+LARGE_REGION_WEIGHT = 1.0
+
+# Rip-ups allowed per fill: one per REPAIR_CELLS cells plus REPAIR_MARGIN.
+# Repair cascades are rare but long; starting over is cheaper.
+REPAIR_CELLS = 2
+REPAIR_MARGIN = 50
+
+# Search nodes allowed for one uniqueness check, and for all the checks of
+# a puzzle per cell. A clue whose check runs out of them is kept.
+UNIQUENESS_MAX_NODES = 2000
+UNIQUENESS_NODES_PER_CELL = 40
 
 
 class PuzzleGenerator:
     """Generates puzzles."""
 
-    def __init__(self, size: int):
-        """Initialize the PuzzleGenerator with a given size."""
+    def __init__(self, size: int, free_value_limit: int = FREE_VALUE_LIMIT):
+        """Initialize the PuzzleGenerator with a given size.
+
+        Regions grow up to ``free_value_limit`` cells, and the uniqueness
+        checks let regions without a clue take as many, as in ``PuzzleSolver``.
+        """
         self.size = size
+        self.free_value_limit = free_value_limit
 
-    def generate_puzzle(self, filled_percentage: float) -> List[List[int]]:
-        """Generate a puzzle."""
-        solved_puzzle = self.solve_puzzle()
+    def generate_puzzle(
+        self, filled_percentage: float, unique: bool = False
+    ) -> List[List[int]]:
+        """Generate a puzzle.
+
+        With ``unique`` clues are only removed while the puzzle keeps a
+        single solution, so it may keep more than ``filled_percentage``.
+        """
+        solved_puzzle = self.fill_grid()
         total_cells = self.size * self.size
         filled_cells_count = int(total_cells * filled_percentage)
+        if unique:
+            return self.remove_clues(solved_puzzle, filled_cells_count)
         filled_cells = [
             (x, y)
             for x in range(self.size)
@@ -32,14 +68,199 @@ class PuzzleGenerator:
 
         return solved_puzzle
 
-    def solve_puzzle(self) -> List[List[int]]:
-        """Solve the puzzle."""
-        field = [[0] * self.size for _ in range(self.size)]
-        x, y = random.randint(0, self.size - 1), random.randint(0, self.size - 1)
-        value = random.randint(1, self.size)
-        field[x][y] = value
-        field_state = FieldState.from_list_to_state(field)["state"]
-        solver = PuzzleSolver(field_state)
-        solved_puzzle = solver.solve()["solved_puzzle"]
+    def remove_clues(self, grid: List[List[int]], keep: int) -> List[List[int]]:
+        """Remove clues of a filled grid in random order while it stays unique.
 
-        return solved_puzzle
+        The puzzle is unique before each removal, so a second solution has
+        to differ from the grid at the removed cell and only those are
+        searched for. Each clue is tried once: removing more clues only adds
+        solutions, so a clue needed once stays needed. Clues whose check runs
+        out of search nodes are kept, as are all clues left once the budget
+        of the puzzle is spent. The checks share one transposition table,
+        since a board proven dead stays dead whichever clues it started from.
+        """
+        puzzle = [row[:] for row in grid]
+        cells = [(x, y) for x in range(self.size) for y in range(self.size)]
+        clues = len(cells)
+        budget = UNIQUENESS_NODES_PER_CELL * len(cells)
+        transpositions = TranspositionTable()
+        for x, y in random.sample(cells, len(cells)):
+            if clues <= keep or budget <= 0:
+                break
+            puzzle[x][y] = 0
+            solver = PuzzleSolver(
+                FieldState.from_list_to_state(puzzle)["state"],
+                transpositions=transpositions,
+                free_value_limit=self.free_value_limit,
+            )
+            try:
+                unique = not solver.count_solutions(
+                    limit=1,
+                    max_nodes=min(UNIQUENESS_MAX_NODES, budget),
+                    exclude={(x, y): grid[x][y]},
+                )
+            except SolveBudgetExceeded:
+                unique = False
+            budget -= solver.nodes
+            if unique:
+                clues -= 1
+            else:
+                puzzle[x][y] = grid[x][y]
+        return puzzle
+
+    def fill_grid(self) -> List[List[int]]:
+        """Build a filled grid by growing random regions, without the solver.
+
+        Regions are grown compactly from the first empty cell in row-major
+        order towards a random size, and end at a size that differs by at
+        least 2 from every filled neighbour. That keeps equal values apart
+        and meets the solver's rule against neighbours differing by 1. Sizes
+        that would enclose an empty cell unable to hold a 1 are avoided. A
+        cell that fits no region rips up a neighbouring region and is
+        retried, and the rare fill that keeps failing starts over.
+        """
+        while (cells := self._grow_regions()) is None:
+            pass
+        return [cells[row : row + self.size] for row in range(0, len(cells), self.size)]
+
+    def _grow_regions(self) -> Optional[List[int]]:
+        """Try to fill the grid once; return None if repairs run out."""
+        area = self.size * self.size
+        neighbours = neighbour_table(self.size)
+        sizes = range(1, min(self.free_value_limit, area) + 1)
+        weights = self._size_weights(len(sizes))
+        cells = [0] * area
+        pending = list(range(area - 1, -1, -1))
+        repairs = area // REPAIR_CELLS + REPAIR_MARGIN
+        while pending:
+            start = pending.pop()
+            if cells[start]:
+                continue
+            target = random.choices(sizes, weights)[0]
+            region = self._grow_region(cells, neighbours, start, target, sizes[-1])
+            if region:
+                for index in region:
+                    cells[index] = len(region)
+                continue
+            if not repairs:
+                return None
+            repairs -= 1
+            filled = [n for n in neighbours[start] if cells[n]]
+            pending.extend(self._rip_up(cells, neighbours, random.choice(filled)))
+            pending.append(start)
+        return cells
+
+    @staticmethod
+    def _size_weights(count: int) -> List[float]:
+        """Return the weights of the region sizes 1..count."""
+        weights: List[float] = list(REGION_SIZE_WEIGHTS[:count])
+        large = range(count - len(weights))
+        return weights + [LARGE_REGION_WEIGHT / 2**step for step in large]
+
+    @staticmethod
+    def _grow_region(
+        cells: List[int],
+        neighbours: Sequence[Sequence[int]],
+        start: int,
+        target: int,
+        limit: int,
+    ) -> List[int]:
+        """Grow a random region from a cell and cut it to a size that fits.
+
+        Growth stops at ``target`` cells, or past it at the first size that
+        fits, up to ``limit``. Returns the cells of the region, or an empty
+        list if no prefix of the growth fits its filled neighbours.
+        """
+        region = [start]
+        members = {start}
+        frontier = [start]
+        forbidden = 0
+        best = fallback = 0
+        while True:
+            forbidden |= PuzzleGenerator._border_cell(
+                cells, neighbours[region[-1]], members, frontier
+            )
+            if not forbidden >> len(region) & 1:
+                fallback = len(region)
+                if not PuzzleGenerator._strands_cell(
+                    cells, neighbours, members, len(region)
+                ):
+                    best = len(region)
+            if len(region) >= target and best or len(region) == limit:
+                break
+            frontier = [index for index in frontier if index not in members]
+            if not frontier:
+                break
+            index = max(
+                frontier,
+                key=lambda cell: sum(
+                    bool(cells[n]) or n in members for n in neighbours[cell]
+                )
+                + random.random(),
+            )
+            frontier.remove(index)
+            members.add(index)
+            region.append(index)
+        return region[: best or fallback]
+
+    @staticmethod
+    def _border_cell(
+        cells: List[int],
+        neighbours: Sequence[int],
+        members: Set[int],
+        frontier: List[int],
+    ) -> int:
+        """Add the empty neighbours of a new region cell to the frontier.
+
+        Returns the mask of the region sizes its filled neighbours forbid:
+        their values and the values next to them.
+        """
+        forbidden = 0
+        for neighbour in neighbours:
+            if value := cells[neighbour]:
+                forbidden |= 7 << (value - 1)
+            elif neighbour not in members:
+                frontier.append(neighbour)
+        return forbidden
+
+    @staticmethod
+    def _strands_cell(
+        cells: List[int],
+        neighbours: Sequence[Sequence[int]],
+        members: Set[int],
+        value: int,
+    ) -> bool:
+        """Check if a region would enclose an empty cell that cannot be a 1."""
+        for member in members:
+            for empty in neighbours[member]:
+                if cells[empty] or empty in members:
+                    continue
+                enclosed = True
+                blocked = value <= 2
+                for neighbour in neighbours[empty]:
+                    if neighbour in members:
+                        continue
+                    if not cells[neighbour]:
+                        enclosed = False
+                        break
+                    blocked = blocked or cells[neighbour] <= 2
+                if enclosed and blocked:
+                    return True
+        return False
+
+    @staticmethod
+    def _rip_up(
+        cells: List[int], neighbours: Sequence[Sequence[int]], index: int
+    ) -> List[int]:
+        """Clear the region containing a cell and return its cells."""
+        value = cells[index]
+        region = [index]
+        stack = [index]
+        cells[index] = 0
+        while stack:
+            for neighbour in neighbours[stack.pop()]:
+                if cells[neighbour] == value:
+                    cells[neighbour] = 0
+                    region.append(neighbour)
+                    stack.append(neighbour)
+        return region
@@ -1,7 +1,145 @@
 """Puzzle solver."""
 
-import collections
-from typing import Dict, List, Tuple, Union
+# pylint: disable=too-many-instance-attributes,too-many-arguments,too-many-lines
+import functools
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+# Largest value a region without a given clue may take by default.
+FREE_VALUE_LIMIT = 9
+
+# Search orderings: "static" keeps the row-major/legacy order.
+ORDER_STATIC = "static"
+ORDER_MRV = "mrv"
+ORDER_LCV = "lcv"
+
+# Search nodes between two deadline and cancellation checks.
+BUDGET_CHECK_INTERVAL = 64
+
+# Seconds between two progress reports.
+PROGRESS_INTERVAL = 0.5
+
+# Learned nogoods kept by a backjumping search, the oldest dropped first.
+NOGOOD_LIMIT = 2000
+
+# Nogoods over more cells than this are not learned, they rarely prune
+# and slow down the lookups.
+NOGOOD_MAX_SIZE = 10
+
+# Distance (in cells) of the decisions first blamed for a dead end.
+EXPLAIN_RADIUS = 5
+
+# Dead partial boards remembered by a solver, the oldest dropped first.
+TRANSPOSITION_LIMIT = 10000
+
+_ZOBRIST_MASK = (1 << 64) - 1
+
+# Undo trail operations.
+_TRAIL_CELL = 0
+_TRAIL_UNION = 1
+_TRAIL_DOMAIN = 2
+
+
+def label_components(
+    neighbours: Sequence[Sequence[int]], keys: Sequence[int]
+) -> Tuple[array, List[int]]:
+    """Label connected cells sharing a key in a single linear pass.
+
+    Cells with a negative key are left unlabelled (-1). Returns the label of
+    every cell and the size of every label.
+    """
+    labels = array("i", [-1]) * len(keys)
+    sizes = []
+    for start, key in enumerate(keys):
+        if key < 0 or labels[start] >= 0:
+            continue
+        label = len(sizes)
+        labels[start] = label
+        not_checked = [start]
+        size = 0
+        while not_checked:
+            index = not_checked.pop()
+            size += 1
+            for neighbour in neighbours[index]:
+                if labels[neighbour] < 0 and keys[neighbour] == key:
+                    labels[neighbour] = label
+                    not_checked.append(neighbour)
+        sizes.append(size)
+    return labels, sizes
+
+
+def mask_values(mask: int) -> List[int]:
+    """Return the values set in a candidate bitmask, ascending."""
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length() - 1)
+        mask ^= low
+    return values
+
+
+def mask_count(mask: int) -> int:
+    """Return the number of values in a candidate bitmask."""
+    return bin(mask).count("1")
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def zobrist_key(index: int, value: int) -> int:
+    """Return the 64-bit Zobrist key of a value in a cell, 0 for an empty cell.
+
+    The keys are drawn by the splitmix64 mix of the cell and the value, so
+    they need no table and cover any value; the cache keeps the ones in use.
+    """
+    if not value:
+        return 0
+    key = ((index << 32 | value) * 0x9E3779B97F4A7C15) & _ZOBRIST_MASK
+    key = ((key ^ key >> 30) * 0xBF58476D1CE4E5B9) & _ZOBRIST_MASK
+    key = ((key ^ key >> 27) * 0x94D049BB133111EB) & _ZOBRIST_MASK
+    return key ^ key >> 31
+
+
+@functools.lru_cache(maxsize=None)
+def neighbour_table(size: int) -> Tuple[Tuple[int, ...], ...]:
+    """Return neighbour indices of every cell, shared by all fields of a size."""
+    table = []
+    for x in range(size):
+        for y in range(size):
+            table.append(
+                tuple(
+                    (x + dx) * size + y + dy
+                    for dx, dy in DIRECTIONS
+                    if 0 <= x + dx < size and 0 <= y + dy < size
+                )
+            )
+    return tuple(table)
+
+
+@functools.lru_cache(maxsize=None)
+def neighbour_cells_table(size: int) -> Tuple[Tuple[Tuple[int, int], ...], ...]:
+    """Return neighbour coordinates of every cell, shared like neighbour_table."""
+    return tuple(
+        tuple(divmod(n, size) for n in neighbours)
+        for neighbours in neighbour_table(size)
+    )
 
 
 class Field:
@@ -11,7 +149,8 @@ class Field:
         """Initialize the Field with a given size."""
         self.check_size(size)
         self._size = size
-        self._neighbor_cache = {}
+        self.neighbours = neighbour_table(size)
+        self._neighbour_cells = neighbour_cells_table(size)
 
     @staticmethod
     def check_size(size: int) -> None:
@@ -26,24 +165,112 @@ class Field:
         """Return the size of the field."""
         return self._size
 
-    def get_all_cells(self) -> List[Tuple[int, int]]:
+    def area(self) -> int:
+        """Return the number of cells in the field."""
+        return self._size * self._size
+
+    def index(self, cell: Tuple[int, int]) -> int:
+        """Return the flat index of a cell."""
+        return cell[0] * self._size + cell[1]
+
+    def cell(self, index: int) -> Tuple[int, int]:
+        """Return the coordinates of a flat index."""
+        return divmod(index, self._size)
+
+    def get_all_cells(self) -> Iterator[Tuple[int, int]]:
         """Return all cells in the field."""
         for x in range(self._size):
             for y in range(self._size):
                 yield x, y
 
-    def get_neighbour_cells(self, cell: Tuple[int, int]) -> set:
+    def get_neighbour_cells(self, cell: Tuple[int, int]) -> Tuple[Tuple[int, int], ...]:
         """Return neighbor cells for a given cell."""
-        if cell not in self._neighbor_cache:
-            x, y = cell
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            neighbour_cells = {(x + dx, y + dy) for dx, dy in directions}
-            self._neighbor_cache[cell] = {
-                (x, y)
-                for x, y in neighbour_cells
-                if 0 <= x < self._size and 0 <= y < self._size
-            }
-        return self._neighbor_cache[cell]
+        return self._neighbour_cells[cell[0] * self._size + cell[1]]
+
+
+class SolveBudgetExceeded(Exception):
+    """Raised inside the search when a solve runs out of budget."""
+
+
+class TranspositionTable:
+    """Bounded set of partial boards proven to have no solution.
+
+    Boards are keyed by their Zobrist hash, so one table may be shared by
+    several searches and solvers, and the oldest board is dropped once
+    ``max_size`` are stored. A ``max_size`` of 0 disables it.
+    """
+
+    def __init__(self, max_size: int = TRANSPOSITION_LIMIT):
+        """Initialize an empty table."""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Any, int], None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple[Any, int]) -> bool:
+        """Check if a board is known to be dead, counting the lookup."""
+        if key in self._entries:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, key: Tuple[Any, int]) -> None:
+        """Record a dead board."""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = None
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every board and reset the counters."""
+        self.hits = self.misses = 0
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit and miss counters, the hit rate and the size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self),
+        }
+
+
+class RegionMap:
+    """Labelled regions of equal connected values of a field state."""
+
+    def __init__(self, state: "FieldState"):
+        """Label every region of the state in one pass."""
+        self.field = state.field
+        self.labels, self.sizes = label_components(self.field.neighbours, state.cells)
+        self.starts = [0] * len(self.sizes)
+        self.values = [0] * len(self.sizes)
+        for index in range(len(self.labels) - 1, -1, -1):
+            self.starts[self.labels[index]] = index
+        for label, start in enumerate(self.starts):
+            self.values[label] = state.cells[start]
+
+    def get_label(self, cell: Tuple[int, int]) -> int:
+        """Return the region label of a cell."""
+        return self.labels[self.field.index(cell)]
+
+    def get_size(self, cell: Tuple[int, int]) -> int:
+        """Return the size of the region containing a cell."""
+        return self.sizes[self.labels[self.field.index(cell)]]
+
+    def get_cells(self, label: int) -> List[Tuple[int, int]]:
+        """Return the cells of a region."""
+        return [
+            self.field.cell(index)
+            for index, cell_label in enumerate(self.labels)
+            if cell_label == label
+        ]
 
 
 class FieldState:
@@ -52,7 +279,9 @@ class FieldState:
     def __init__(self, field: Field):
         """Initialize the FieldState with a given field."""
         self.field = field
-        self._state = collections.defaultdict(lambda: 0)
+        self._size = field.size()
+        self._state = array("I", [0]) * field.area()
+        self._hash = 0
 
     @staticmethod
     def from_list_to_state(
@@ -62,6 +291,8 @@ class FieldState:
         try:
             size = len(matrix)
             field = Field(size)
+            if any(len(row) != size for row in matrix):
+                raise ValueError("Field should be square")
             state = FieldState(field)
 
             for x in range(size):
@@ -69,19 +300,54 @@ class FieldState:
                     state.set_state((x, y), matrix[x][y])
 
             return {"state": state}
-        except (TypeError, ValueError) as excp:
+        except (TypeError, ValueError, OverflowError) as excp:
             return {"error": str(excp)}
 
+    @staticmethod
+    def from_bytes(data: bytes) -> "FieldState":
+        """Create a FieldState from the raw bytes of a square cell array."""
+        cells = array("I")
+        cells.frombytes(data)
+        state = FieldState(Field(math.isqrt(len(cells))))
+        state.cells[:] = cells
+        state.rehash()
+        return state
+
+    def to_bytes(self) -> bytes:
+        """Return the raw bytes of the cell array."""
+        return self._state.tobytes()
+
     def to_list(self) -> List[List[int]]:
         """Convert FieldState to a list of lists."""
-        size = self.field.size()
-        result = []
-        for x in range(size):
-            row = []
-            for y in range(size):
-                row.append(self._state[x, y])
-            result.append(row)
-        return result
+        size = self._size
+        return [self._state[x * size : (x + 1) * size].tolist() for x in range(size)]
+
+    @property
+    def cells(self) -> array:
+        """Return the flat cell array, for engines that update it in place.
+
+        Writes to it bypass the hash, use ``set_index`` or ``rehash``.
+        """
+        return self._state
+
+    @property
+    def zobrist(self) -> int:
+        """Return the Zobrist hash of the board, kept up to date by the setters."""
+        return self._hash
+
+    def rehash(self) -> None:
+        """Recompute the Zobrist hash after writing to ``cells`` directly."""
+        board_hash = 0
+        for index, value in enumerate(self._state):
+            board_hash ^= zobrist_key(index, value)
+        self._hash = board_hash
+
+    def copy(self) -> "FieldState":
+        """Return an independent copy sharing the same field."""
+        state = FieldState(self.field)
+        state.cells[:] = self._state
+        state._hash = self._hash  # pylint: disable=protected-access
+        return state
 
     def set_state(self, coords: Tuple[int, int], value: int) -> None:
         """Set the state of a cell."""
@@ -90,267 +356,1364 @@ class FieldState:
 
         if not isinstance(value, int):
             raise TypeError("Value should be an integer")
-        self._state[coords] = value
+        self.set_index(coords[0] * self._size + coords[1], value)
 
     def get_state(self, coords: Tuple[int, int]) -> int:
         """Get the state of a cell."""
-        return self._state[coords]
+        return self._state[coords[0] * self._size + coords[1]]
+
+    def set_index(self, index: int, value: int) -> None:
+        """Set the state of a cell by flat index, without validation."""
+        previous = self._state[index]
+        self._state[index] = value
+        self._hash ^= zobrist_key(index, previous) ^ zobrist_key(index, value)
+
+    def get_index(self, index: int) -> int:
+        """Get the state of a cell by flat index."""
+        return self._state[index]
 
     def get_involved(self, cell: Tuple[int, int]) -> List[Tuple[int, int]]:
         """Get involved cells for a given cell."""
-        involved = [cell]
-        value = self._state[cell]
-        not_checked = [cell]
+        start = self.field.index(cell)
+        involved = [start]
+        value = self._state[start]
+        visited = bytearray(len(self._state))
+        visited[start] = 1
+        not_checked = [start]
+        neighbours = self.field.neighbours
 
         while not_checked:
-            cell = not_checked.pop()
+            index = not_checked.pop()
 
-            for neighbour in self.field.get_neighbour_cells(cell):
-                if neighbour not in involved and self._state[neighbour] == value:
+            for neighbour in neighbours[index]:
+                if not visited[neighbour] and self._state[neighbour] == value:
+                    visited[neighbour] = 1
                     involved.append(neighbour)
                     not_checked.append(neighbour)
 
-        return involved
-
-
-class CellsGroup:
-    """Represents a group of cells with the same value."""
-
-    def __init__(self, value: int, initial_cells: List[Tuple[int, int]]):
-        """Initialize the CellsGroup with a value and initial cells."""
-        self.value = value
-        self.initial_cells = initial_cells
-        self.possible_cells = []
-        self.possible_connection_cells = []
-
-    def get_value(self) -> int:
-        """Get the value of the group."""
-        return self.value
-
-    def get_possible_length(self) -> int:
-        """Get the possible length of the group."""
-        return (
-            len(self.initial_cells)
-            + len(self.possible_cells)
-            + len(self.possible_connection_cells)
-        )
-
-    def add_possible_cell(self, cell: Tuple[int, int]) -> None:
-        """Add a possible cell to the group."""
-        if cell not in self.possible_cells:
-            self.possible_cells.append(cell)
-
-    def add_connection(self, cell: Tuple[int, int]) -> None:
-        """Add a connection to the group."""
-        if cell not in self.possible_connection_cells:
-            self.possible_connection_cells.append(cell)
+        return [self.field.cell(index) for index in involved]
+
+    def label_regions(self) -> RegionMap:
+        """Label all regions of the board in one pass."""
+        return RegionMap(self)
+
+
+class _Frame:  # pylint: disable=too-few-public-methods
+    """A branching cell on the search stack.
+
+    ``values`` are the values left to try, last first, ``value`` the one
+    taken (0 while none is) and ``mark`` the trail length before it.
+    ``found`` is the number of solutions when the frame was pushed and
+    ``level`` the number of decisions above it. A backjumping search
+    gathers the ``conflict`` set of the frame and the ``refuted`` values of
+    its cell.
+    """
+
+    __slots__ = (
+        "cell",
+        "values",
+        "mark",
+        "found",
+        "level",
+        "value",
+        "conflict",
+        "refuted",
+    )
+
+    def __init__(self, cell: int, values: List[int], mark: int, found: int, level: int):
+        """Initialize a frame that has not branched yet."""
+        self.cell = cell
+        self.values = values
+        self.mark = mark
+        self.found = found
+        self.level = level
+        self.value = 0
+        self.conflict: Set[int] = set()
+        self.refuted = 0
 
 
 class PuzzleSolver:
     """Solves the puzzle."""
 
-    possible_values: collections.defaultdict
-    involved: list = []
-    unfilled_groups: dict = {}
-
-    def __init__(self, field_state: FieldState):
-        """Initialize the PuzzleSolver with a field state."""
+    # Candidate domain of every cell: bit ``v`` is set when ``v`` may go there.
+    possible_values: List[int]
+
+    # Every piece of search state starts out here, one statement each.
+    def __init__(  # pylint: disable=too-many-statements
+        self,
+        field_state: FieldState,
+        propagate: bool = True,
+        variable_order: str = ORDER_STATIC,
+        value_order: str = ORDER_STATIC,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        progress_interval: float = PROGRESS_INTERVAL,
+        backjump: bool = False,
+        nogood_limit: int = NOGOOD_LIMIT,
+        transposition_limit: int = TRANSPOSITION_LIMIT,
+        transpositions: Optional[TranspositionTable] = None,
+        free_value_limit: int = FREE_VALUE_LIMIT,
+        decompose: bool = False,
+        counters: bool = True,
+    ):
+        """Initialize the PuzzleSolver with a field state.
+
+        ``propagate`` runs the deduction pass before the search and after
+        every guess; switching it off leaves a plain backtracking search.
+        ``variable_order`` is ``"mrv"`` (fewest candidates first) or
+        ``"static"`` (last empty cell in row-major order), ``value_order``
+        is ``"lcv"`` (least constraining first) or ``"static"``.
+
+        ``progress`` is called with the nodes searched, the current depth,
+        the cells filled by propagation and the partial board, at most once
+        every ``progress_interval`` seconds and only at budget checks.
+
+        ``backjump`` makes the search jump back to the latest decision
+        causing a dead end instead of the previous one, and learn the
+        decisions behind each dead end as a nogood that prunes later
+        branches. At most ``nogood_limit`` nogoods are kept.
+
+        Partial boards proven dead are remembered in ``transpositions``, a
+        table of ``transposition_limit`` boards by default. The table outlives
+        a search: a search never meets the same board twice, but later
+        searches of this solver, or of any solver sharing the table, do.
+
+        Regions without a clue take values up to ``free_value_limit``;
+        the board area lifts the ceiling, at the cost of wider domains.
+        Regions with a clue take its value whatever the limit.
+
+        ``decompose`` splits the open cells into components that cannot
+        affect each other, see ``components``, and ``solve`` searches them one
+        after another, so their search costs add up instead of multiplying.
+        The first solution may differ from the one of a search of the whole
+        board. ``count_solutions`` and ``split`` always take the whole board.
+
+        ``counters`` keeps the counters and phase timings of ``get_stats``;
+        without it they stay at zero, except ``nodes`` which the budget needs.
+        """
+        if variable_order not in (ORDER_STATIC, ORDER_MRV):
+            raise ValueError(f"Unknown variable order: {variable_order}")
+        if value_order not in (ORDER_STATIC, ORDER_LCV):
+            raise ValueError(f"Unknown value order: {value_order}")
+        if free_value_limit < 1:
+            raise ValueError("Free value limit should be positive")
         self.field_state = field_state
-        self.state_changed = True
+        self.free_value_limit = free_value_limit
+        self.propagate = propagate
+        self.variable_order = variable_order
+        self.value_order = value_order
+        self.decompose = decompose
+        self.counters = counters
+        self._neighbours = field_state.field.neighbours
+        self._parent: List[int] = []
+        self._group_size: List[int] = []
+        self._trail: List[Tuple[int, int, int]] = []
+        self._queue: List[int] = []
+        self._consistent = True
+        self.solutions: List[List[List[int]]] = []
+        self.nodes = 0
+        self._max_nodes: Optional[int] = None
+        self._deadline: Optional[float] = None
+        self._cancel: Optional[threading.Event] = None
+        self._progress = progress
+        self._progress_interval = progress_interval
+        self._next_progress = 0.0
+        self.backjump = backjump
+        self.nogood_limit = nogood_limit
+        self._decisions: List[Tuple[int, int]] = []
+        self._assigned_at: List[int] = []
+        self._root_values: List[int] = []
+        self._probe: Optional["PuzzleSolver"] = None
+        self._probe_literals: List[Tuple[int, int]] = []
+        self._probe_marks: List[int] = []
+        self._nogoods: "OrderedDict[FrozenSet[Tuple[int, int]], None]" = OrderedDict()
+        self._nogood_index: Dict[Tuple[int, int], Set[FrozenSet[Tuple[int, int]]]] = {}
+        self.transpositions = (
+            TranspositionTable(transposition_limit)
+            if transpositions is None
+            else transpositions
+        )
+        self._transposition_context: Tuple[int, int, Tuple[int, ...]] = (0, 0, ())
+        self._excluded: List[int] = []
+        self._stack: List[_Frame] = []
+        self._path: List[Tuple[int, int]] = []
+        self._root_hash = 0
+        self._region: Optional[bytearray] = None
+        self._scope: Optional[List[int]] = None
+        self._settled: List[Tuple[int, int]] = []
+        self._clues = 0
+        self.depth = 0
+        self.backtracks = 0
+        self.refreshes = 0
+        self.flood_fills = 0
+        self.propagations = 0
+        self.propagation_steps = 0
+        self.backjumps = 0
+        self.nogood_prunes = 0
+        self.transposition_lookups = 0
+        self.transposition_hits = 0
+        self.component_count = 0
+        self.timings: Dict[str, float] = {}
+
+    def solve(
+        self,
+        timeout: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+        cancel: Optional[threading.Event] = None,
+        stats: bool = False,
+        path: Sequence[Tuple[int, int]] = (),
+        resume: Optional[Dict[str, Any]] = None,
+        region: Optional[Sequence[int]] = None,
+    ) -> Dict[str, Any]:
+        """Solve the puzzle.
+
+        ``timeout`` (seconds) and ``max_nodes`` bound the search, and
+        ``cancel`` is any event-like object whose ``is_set()`` stops it. When
+        a budget runs out the result carries ``budget_exceeded`` with the
+        reason, the partial board reached and the number of nodes searched.
+        With ``stats`` the result also carries the counters and phase timings
+        of ``get_stats``. ``path`` restricts the search to a subtree returned
+        by ``split``. ``region`` restricts it to one of the ``components`` of
+        the board, leaving the open cells of the others empty.
+
+        A result cut short by the budget also carries the ``checkpoint`` of
+        the search; solving the same board with it as ``resume`` continues
+        where the search stopped, in this process or another one.
+        """
+        result = self._solve(timeout, max_nodes, cancel, path, resume, region)
+        if stats:
+            result["stats"] = self.get_stats()
+        return result
 
-    def solve(self) -> Dict[str, Union[List[List[int]], str]]:
-        """Solve the puzzle."""
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the counters and phase timings (seconds) of the last search.
+
+        The ``search`` phase includes the propagation after every guess, the
+        ``propagate`` phase only the initial pass.
+        """
+        return {
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "refreshes": self.refreshes,
+            "flood_fills": self.flood_fills,
+            "propagations": self.propagations,
+            "propagation_steps": self.propagation_steps,
+            "backjumps": self.backjumps,
+            "nogoods": len(self._nogoods),
+            "nogood_prunes": self.nogood_prunes,
+            "transposition_lookups": self.transposition_lookups,
+            "transposition_hits": self.transposition_hits,
+            "transpositions": len(self.transpositions),
+            "components": self.component_count,
+            "timings": dict(self.timings),
+        }
+
+    def _solve(
+        self,
+        timeout: Optional[float],
+        max_nodes: Optional[int],
+        cancel: Optional[threading.Event],
+        path: Sequence[Tuple[int, int]],
+        resume: Optional[Dict[str, Any]],
+        region: Optional[Sequence[int]],
+    ) -> Dict[str, Any]:
+        """Solve the puzzle within the budget, see ``solve``."""
+        self._start_budget(timeout, max_nodes, cancel)
+        frames: Sequence[Sequence[Any]] = ()
+        settled: Sequence[Sequence[int]] = ()
         try:
-            self._refresh_state()
-            self._try_fill_empty_cells()
-            if self.check_for_zeros():
+            if resume is not None:
+                if resume["zobrist"] != self.field_state.zobrist:
+                    raise ValueError("Checkpoint does not match the board")
+                path = list(resume["path"])
+                frames = resume["frames"]
+                settled = resume.get("settled", ())
+                region = resume.get("region", region)
+            self._path = list(path)
+            self._scope = None if region is None else list(region)
+            self._timed("refresh", self._refresh_state)
+            solved = (
+                self._consistent
+                and self._timed("propagate", self._propagate)
+                and self._replay(path)
+                and self._settle(settled)
+                and self._timed(
+                    "search", lambda: self._search_components(len(path), frames)
+                )
+            )
+            cells = self.field_state.cells
+            if not solved or (
+                self.check_for_zeros()
+                if self._scope is None
+                else not all(cells[index] for index in self._scope)
+            ):
+                self._undo(0)
                 return {"error": "Puzzle is unsolvable"}
             return {"solved_puzzle": self.field_state.to_list()}
+        except SolveBudgetExceeded as excp:
+            partial_puzzle = self.field_state.to_list()
+            self._undo(0)
+            return {
+                "error": "Solve budget exceeded",
+                "budget_exceeded": str(excp),
+                "partial_puzzle": partial_puzzle,
+                "nodes": self.nodes,
+                "checkpoint": self.checkpoint(),
+            }
         except (ValueError, TypeError) as excp:
+            # A checkpoint may be rejected after some of its frames are taken.
+            self._undo(0)
+            self._queue.clear()
+            self._stack = []
             return {"error": str(excp)}
 
+    def count_solutions(
+        self,
+        limit: int = 2,
+        timeout: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+        cancel: Optional[threading.Event] = None,
+        exclude: Optional[Dict[Tuple[int, int], int]] = None,
+        path: Sequence[Tuple[int, int]] = (),
+    ) -> int:
+        """Count the solutions of the puzzle, stopping once ``limit`` are found.
+
+        ``exclude`` maps cells to a value they may not take, which only
+        counts the solutions differing from a known one there. The solutions
+        found are kept in ``solutions`` and the board is left as it was. The
+        budget and ``path`` are the ones of ``solve``, but running out of the
+        budget raises ``SolveBudgetExceeded`` since a partial count means
+        nothing.
+        """
+        self._start_budget(timeout, max_nodes, cancel)
+        try:
+            self._refresh_state()
+            for cell, value in (exclude or {}).items():
+                index = self.field_state.field.index(cell)
+                self._excluded.append(index)
+                if self.field_state.cells[index]:
+                    self._consistent &= self.field_state.cells[index] != value
+                else:
+                    self._consistent &= self._remove_values(index, 1 << value)
+            if self._consistent and self._propagate() and self._replay(path):
+                self._try_fill_empty_cells(limit, depth=len(path))
+        except ValueError:
+            self.solutions = []
+        finally:
+            self._undo(0)
+        return len(self.solutions)
+
+    def split(self, count: int) -> List[List[Tuple[int, int]]]:
+        """Split the search tree into at least ``count`` subtrees if it can.
+
+        The tree is expanded level by level. Each subtree is given by its
+        path, the ``(cell index, value)`` branches leading to it from the
+        root. The subtrees are disjoint, cover every solution and come in
+        the order the search visits them, so the first solution of the
+        first solvable subtree is the one ``solve`` finds. Branches refuted
+        by propagation are dropped, so no subtrees means no solution. A
+        filled board is a subtree of its own. A board breaking the rules
+        raises the ``ValueError`` that ``solve`` reports.
+        """
+        self._start_budget(None, None, None)
+        try:
+            self._refresh_state()
+            if not (self._consistent and self._propagate()):
+                return []
+            paths: List[List[Tuple[int, int]]] = [[]]
+            while len(paths) < count:
+                expanded = [child for path in paths for child in self._branches(path)]
+                if expanded == paths:
+                    break
+                paths = expanded
+            return paths
+        finally:
+            self._undo(0)
+
+    def components(self) -> List[List[int]]:
+        """Split the open cells of the board into independent components.
+
+        Open cells are joined when they touch, or touch the same unfinished
+        group; finished groups wall them off. A component holds its open
+        cells and the cells of the unfinished groups they may join, so
+        filling one component never changes the candidates of another. The
+        cell indexes of each component come in row-major order, the
+        components by their first cell. The board is taken after the
+        initial propagation; none are left when it is full or refuted. A
+        board breaking the rules raises ``ValueError`` as in ``split``.
+        """
+        self._start_budget(None, None, None)
+        try:
+            self._refresh_state()
+            if not (self._consistent and self._propagate()):
+                return []
+            return self._components()
+        finally:
+            self._undo(0)
+
+    def _components(self) -> List[List[int]]:
+        """Return the components of the current board, see ``components``."""
+        cells = self.field_state.cells
+        seen = bytearray(len(cells))
+        components = []
+        for start, start_value in enumerate(cells):
+            if start_value or seen[start]:
+                continue
+            seen[start] = 1
+            component = [start]
+            not_checked = [start]
+            while not_checked:
+                index = not_checked.pop()
+                value = cells[index]
+                for neighbour in self._neighbours[index]:
+                    other = cells[neighbour]
+                    if seen[neighbour] or (
+                        other
+                        and (
+                            (value and other != value)
+                            or self._group_size[self._find(neighbour)] >= other
+                        )
+                    ):
+                        continue
+                    seen[neighbour] = 1
+                    component.append(neighbour)
+                    not_checked.append(neighbour)
+            components.append(sorted(component))
+        return components
+
+    def _search_components(self, depth: int, frames: Sequence[Sequence[Any]]) -> bool:
+        """Search the components of the board one after another.
+
+        Each search only branches on the cells of its component, restored
+        from the checkpoint ``frames`` for the first one. A component
+        without a solution leaves none for the board. A board that does not
+        split, or that is not decomposed, is searched as a whole.
+        """
+        if self._scope is not None:
+            components = [self._scope]
+        else:
+            components = self._components() if self.decompose else []
+            if len(components) < 2:
+                self.component_count = 1
+                return self._try_fill_empty_cells(depth=depth, frames=frames)
+        self.component_count = len(components)
+        cells = self.field_state.cells
+        try:
+            for component in components:
+                self._region = bytearray(len(cells))
+                for index in component:
+                    self._region[index] = 1
+                self.solutions = []
+                self._decisions = []
+                if not self._try_fill_empty_cells(depth=depth, frames=frames):
+                    return False
+                frames = ()
+                self._settled.extend((index, cells[index]) for index in component)
+            return True
+        finally:
+            self._region = None
+
+    def _settle(self, settled: Sequence[Sequence[int]]) -> bool:
+        """Fill the cells of the components solved before a checkpoint."""
+        cells = self.field_state.cells
+        for index, value in settled:
+            if cells[index] != value and (
+                cells[index] or not (self._assign(index, value) and self._propagate())
+            ):
+                raise ValueError("Checkpoint does not match the board")
+            self._settled.append((index, value))
+        return True
+
+    def _branches(self, path: List[Tuple[int, int]]) -> List[List[Tuple[int, int]]]:
+        """Return the paths of the children of a subtree that propagation keeps."""
+        mark = len(self._trail)
+        try:
+            if not self._replay(path):
+                return []
+            cell = self._next_cell()
+            if cell < 0:
+                return [path]
+            children = []
+            for value in self._ordered_values(cell):
+                branch = len(self._trail)
+                if self._assign(cell, value) and self._propagate():
+                    children.append(path + [(cell, value)])
+                self._undo(branch)
+            return children
+        finally:
+            self._undo(mark)
+
+    def _replay(self, path: Sequence[Tuple[int, int]]) -> bool:
+        """Take the branches of a path, returning False if one fails."""
+        for index, value in path:
+            if self.field_state.cells[index] or not (
+                self._assign(index, value) and self._propagate()
+            ):
+                return False
+        return True
+
+    def _start_budget(
+        self,
+        timeout: Optional[float],
+        max_nodes: Optional[int],
+        cancel: Optional[threading.Event],
+    ) -> None:
+        """Reset the counters and the found solutions for a new search."""
+        self.nodes = 0
+        self.backtracks = 0
+        self.refreshes = 0
+        self.flood_fills = 0
+        self.propagations = 0
+        self.propagation_steps = 0
+        self.backjumps = 0
+        self.nogood_prunes = 0
+        self.transposition_lookups = 0
+        self.transposition_hits = 0
+        self.timings = {}
+        self.solutions = []
+        self._decisions = []
+        self._probe = None
+        self._nogoods = OrderedDict()
+        self._nogood_index = {}
+        self._excluded = []
+        self._stack = []
+        self._path = []
+        self._region = None
+        self._scope = None
+        self._settled = []
+        self.component_count = 0
+        self._root_hash = self.field_state.zobrist
+        self._max_nodes = max_nodes
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+        self._cancel = cancel
+        self._next_progress = time.monotonic()
+        self._clues = len(self.field_state.cells) - self.field_state.cells.count(0)
+        self.depth = 0
+
+    def _timed(self, phase: str, func: Callable[[], Any]) -> Any:
+        """Call a search phase and add its wall time to ``timings``."""
+        if not self.counters:
+            return func()
+        started = time.perf_counter()
+        try:
+            return func()
+        finally:
+            self.timings[phase] = (
+                self.timings.get(phase, 0.0) + time.perf_counter() - started
+            )
+
+    def _check_budget(self) -> None:
+        """Count a search node and stop the search once the budget is spent."""
+        self.nodes += 1
+        if self._max_nodes is not None and self.nodes > self._max_nodes:
+            raise SolveBudgetExceeded("max_nodes")
+        if self.nodes % BUDGET_CHECK_INTERVAL == 1:
+            if self._cancel is not None and self._cancel.is_set():
+                raise SolveBudgetExceeded("cancelled")
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                raise SolveBudgetExceeded("timeout")
+            if self._progress is not None:
+                self._report_progress()
+
+    def _report_progress(self) -> None:
+        """Report the search progress once the progress interval has passed."""
+        now = time.monotonic()
+        if now < self._next_progress:
+            return
+        self._next_progress = now + self._progress_interval
+        cells = self.field_state.cells
+        filled = len(cells) - cells.count(0)
+        self._progress(
+            {
+                "nodes": self.nodes,
+                "depth": self.depth,
+                "propagated": filled - self._clues - self.depth,
+                "partial_puzzle": self.field_state.to_list(),
+            }
+        )
+
     def _refresh_state(self) -> None:
-        """Refresh the state of the puzzle."""
-        self._find_unfilled_groups()
-        for cell in filter(
-            lambda c: self.field_state.get_state(c) != 0 and c in self.unfilled_groups,
-            self.field_state.field.get_all_cells(),
+        """Rebuild groups and candidates from scratch.
+
+        Only used once before the search: afterwards the bookkeeping is kept
+        up to date by ``_assign`` and rolled back by ``_undo``.
+        """
+        if self.counters:
+            self.refreshes += 1
+        cells = self.field_state.cells
+        size = len(cells)
+        regions = self.field_state.label_regions()
+        roots = [start for start in regions.starts if cells[start]]
+        self._parent = [
+            regions.starts[label] if cells[index] else index
+            for index, label in enumerate(regions.labels)
+        ]
+        self._group_size = [1] * size
+        self._assigned_at = [0] * size
+        for root in roots:
+            self._group_size[root] = regions.sizes[regions.labels[root]]
+        self._trail = []
+
+        # A clue above the board area can never be met, and would make
+        # candidate masks as wide as its value.
+        if any(
+            self._group_size[root] > cells[root] or cells[root] > size for root in roots
         ):
-            self._find_possible_values(cell)
-
-        empty_cells = list(
-            filter(
-                lambda c: self.field_state.get_state(c) == 0,
-                self.field_state.field.get_all_cells(),
+            raise ValueError("Wrong group size")
+        unfilled_roots = [
+            root for root in roots if self._group_size[root] < cells[root]
+        ]
+
+        limit = self.free_value_limit
+        values = set(range(1, limit + 1))
+        values.update(cells[root] for root in unfilled_roots)
+        self._transposition_context = (
+            size,
+            limit,
+            tuple(sorted(value for value in values if value > limit)),
+        )
+        self.possible_values = [
+            (
+                0
+                if cells[index]
+                else sum(
+                    1 << value for value in values if self._value_fits(index, value)
+                )
             )
+            for index in range(size)
+        ]
+        self._consistent = self._prune_small_areas(values, unfilled_roots)
+        self._queue = list(range(size))
+        self._consistent = self._consistent and all(
+            self.possible_values[index] for index in range(size) if not cells[index]
         )
 
-        involved = set()
-        for cell in empty_cells:
-            if all(
-                self.field_state.get_state(n) != 1
-                for n in self.field_state.field.get_neighbour_cells(cell)
-            ):
-                self._add_possible_value(cell, 1)
+    def _prune_small_areas(self, values: Set[int], unfilled_roots: List[int]) -> bool:
+        """Drop candidates whose cells cannot reach a group of their size.
 
-            if cell not in involved:
-                empty_group = self.field_state.get_involved(cell)
-                involved = involved.union(empty_group)
-                self._find_additional_values(empty_group)
+        For each value the cells holding or allowing it are flood-filled, and
+        the value is dropped from areas smaller than it. Returns False if an
+        unfilled group lies in such an area.
+        """
+        cells = self.field_state.cells
+        possible_values = self.possible_values
+        consistent = True
+        if self.counters:
+            self.flood_fills += len(values) + 1
+        for value in values:
+            bit = 1 << value
+            labels, lengths = label_components(
+                self._neighbours,
+                [
+                    0 if cells[index] == value or possible_values[index] & bit else -1
+                    for index in range(len(cells))
+                ],
+            )
+            for index, label in enumerate(labels):
+                if possible_values[index] & bit and lengths[label] < value:
+                    possible_values[index] ^= bit
+            consistent = consistent and all(
+                cells[root] != value or lengths[labels[root]] >= value
+                for root in unfilled_roots
+            )
+        return consistent
+
+    def _find(self, index: int) -> int:
+        """Return the root cell of the group containing a cell."""
+        parent = self._parent
+        while parent[index] != index:
+            index = parent[index]
+        return index
+
+    def _union(self, root: int, other: int) -> int:
+        """Merge two groups by size and return the new root."""
+        if self._group_size[root] < self._group_size[other]:
+            root, other = other, root
+        self._parent[other] = root
+        self._group_size[root] += self._group_size[other]
+        self._trail.append((_TRAIL_UNION, other, root))
+        return root
+
+    def _value_fits(self, index: int, value: int) -> bool:
+        """Check a value against the neighbours of an empty cell."""
+        cells = self.field_state.cells
+        merged = 1
+        roots = []
+        for neighbour in self._neighbours[index]:
+            n_value = cells[neighbour]
+            if n_value == value:
+                root = self._find(neighbour)
+                if root not in roots:
+                    roots.append(root)
+                    merged += self._group_size[root]
+            elif n_value and abs(n_value - value) == 1:
+                return False  # Value conflicts with adjacent cell
+        return merged <= value
+
+    def _has_room(self, seeds: Iterable[int], value: int, length: int) -> bool:
+        """Check that a group can still grow to ``value`` cells."""
+        if length >= value:
+            return True
+        if self.counters:
+            self.flood_fills += 1
+        cells = self.field_state.cells
+        possible_values = self.possible_values
+        visited = set(seeds)
+        not_checked = list(visited)
+        while not_checked:
+            index = not_checked.pop()
+            for neighbour in self._neighbours[index]:
+                if neighbour in visited:
+                    continue
+                n_value = cells[neighbour]
+                if n_value == value or (
+                    not n_value and possible_values[neighbour] >> value & 1
+                ):
+                    visited.add(neighbour)
+                    not_checked.append(neighbour)
+                    length += 1
+                    if length >= value:
+                        return True
+        return False
+
+    def _group_cells(self, index: int) -> List[int]:
+        """Return the cells of the group containing a filled cell."""
+        cells = self.field_state.cells
+        value = cells[index]
+        group = [index]
+        visited = {index}
+        not_checked = [index]
+        while not_checked:
+            cell = not_checked.pop()
+            for neighbour in self._neighbours[cell]:
+                if neighbour not in visited and cells[neighbour] == value:
+                    visited.add(neighbour)
+                    group.append(neighbour)
+                    not_checked.append(neighbour)
+        return group
 
-        self.state_changed = True
+    def _group_has_room(self, index: int) -> bool:
+        """Check that the group containing a filled cell can be completed."""
+        value = self.field_state.cells[index]
+        length = self._group_size[self._find(index)]
+        if length >= value:
+            return True
+        return self._has_room(self._group_cells(index), value, length)
+
+    def _remove_values(self, index: int, mask: int) -> bool:
+        """Remove candidates, returning False if the cell has none left."""
+        candidates = self.possible_values[index]
+        removed = candidates & mask
+        if removed:
+            self._trail.append((_TRAIL_DOMAIN, index, candidates))
+            candidates ^= removed
+            self.possible_values[index] = candidates
+            if not candidates & (candidates - 1):
+                self._queue.append(index)
+            cells = self.field_state.cells
+            self._queue.extend(
+                neighbour
+                for neighbour in self._neighbours[index]
+                if removed >> cells[neighbour] & 1
+            )
+        return candidates != 0
+
+    def _assign(self, index: int, value: int) -> bool:
+        """Place a value and update the neighbourhood bookkeeping.
+
+        Returns False when the placement leads to a contradiction. The trail
+        is consistent either way, so the caller can always ``_undo`` it.
+        """
+        cells = self.field_state.cells
+        neighbours = self._neighbours
+        self.field_state.set_index(index, value)
+        self._assigned_at[index] = len(self._decisions)
+        self._trail.append((_TRAIL_CELL, index, value))
+        self._queue.append(index)
+        self._queue.extend(
+            neighbour for neighbour in neighbours[index] if cells[neighbour]
+        )
 
-    def _find_additional_values(self, empty_group: List[Tuple[int, int]]) -> None:
-        """Find additional values for an empty group."""
-        for value in range(2, min(len(empty_group) + 1, 10)):
-            involved_for_value = set(empty_group)
-            not_possible_cells = set()
+        root = index
+        for neighbour in neighbours[index]:
+            if cells[neighbour] == value:
+                other = self._find(neighbour)
+                if other != root:
+                    root = self._union(root, other)
+        length = self._group_size[root]
+        if length > value:
+            return False
 
-            for involved in involved_for_value:
-                if any(
-                    self.field_state.get_state(n) == value
-                    for n in self.field_state.field.get_neighbour_cells(involved)
-                ):
-                    not_possible_cells.add(involved)
-            involved_for_value -= not_possible_cells
-
-            if value <= len(involved_for_value):
-                for cell in involved_for_value:
-                    self._add_possible_value(cell, value)
-
-    def _find_unfilled_groups(self) -> None:
-        """Find unfilled groups in the puzzle."""
-        self.unfilled_groups = {}
-        self.involved = []
-        self.possible_values = collections.defaultdict(lambda: [])
-
-        for cell in filter(
-            lambda x: self.field_state.get_state(x) != 0,
-            self.field_state.field.get_all_cells(),
+        group = self._group_cells(index)
+        if not (
+            self._wall_off(index, group, value, length)
+            and self._has_room(group, value, length)
         ):
-            if cell not in self.involved:
-                initial_cells = self.field_state.get_involved(cell)
-                self.involved += initial_cells
-                value = self.field_state.get_state(cell)
-
-                if len(initial_cells) < value:
-                    new_group = CellsGroup(value, initial_cells)
-                    for c in initial_cells:
-                        self.unfilled_groups[c] = new_group
-
-                if len(initial_cells) > value:
-                    raise ValueError("Wrong group size")
-
-    def _find_possible_values(self, cell: Tuple[int, int]) -> None:
-        """Find possible values for a cell."""
-        next_cells = [(cell, 0)]
-        value = self.field_state.get_state(cell)
-        previous_cells = []
-        group = self.unfilled_groups[cell]
-
-        while next_cells:
-            current_cell, current_length = next_cells.pop()
-            previous_cells.append(current_cell)
-
-            way_length = current_length + len(group.initial_cells)
-
-            if way_length < value and current_cell != cell:
-                self._add_possible_value(current_cell, value)
-                group.add_possible_cell(current_cell)
-
-            elif way_length == value:
-                self._add_possible_value(current_cell, value)
-                group.add_possible_cell(current_cell)
-                continue
+            return False
+        return all(
+            self._group_has_room(neighbour)
+            for neighbour in neighbours[index]
+            if cells[neighbour] and cells[neighbour] != value
+        )
 
-            free_neighbours = filter(
-                lambda n: self.field_state.get_state(n) == 0
-                and n not in previous_cells,
-                self.field_state.field.get_neighbour_cells(current_cell),
+    def _wall_off(self, index: int, group: List[int], value: int, length: int) -> bool:
+        """Remove the candidates a placed value rules out around its group.
+
+        Neighbours of the cell lose the values differing from it by 1, and
+        the border of the group loses the value once the group is complete
+        or where it could not join it. Returns False on a contradiction.
+        """
+        cells = self.field_state.cells
+        neighbours = self._neighbours
+        adjacent = 0b101 << (value - 1)
+        for neighbour in neighbours[index]:
+            if not cells[neighbour] and not self._remove_values(neighbour, adjacent):
+                return False
+
+        border = {
+            neighbour
+            for cell in group
+            for neighbour in neighbours[cell]
+            if not cells[neighbour]
+        }
+        bit = 1 << value
+        return all(
+            self._remove_values(neighbour, bit)
+            for neighbour in border
+            if self.possible_values[neighbour] & bit
+            and (length == value or not self._value_fits(neighbour, value))
+        )
+
+    def _extension_cells(self, index: int) -> List[int]:
+        """Return the empty cells an unfinished group can still grow into."""
+        cells = self.field_state.cells
+        value = cells[index]
+        return list(
+            {
+                neighbour
+                for cell in self._group_cells(index)
+                for neighbour in self._neighbours[cell]
+                if not cells[neighbour] and self.possible_values[neighbour] >> value & 1
+            }
+        )
+
+    def _propagate(self) -> bool:
+        """Fill forced cells until a fixpoint, returning False on a conflict.
+
+        A cell with a single candidate takes it, and an unfinished group with
+        a single cell left to grow into extends there. Completed regions are
+        walled off by ``_assign`` as soon as they close.
+        """
+        queue = self._queue
+        if not self.propagate:
+            queue.clear()
+            return True
+        if self.counters:
+            self.propagations += 1
+        steps = 0
+        try:
+            while queue:
+                steps += 1
+                if not self._propagate_cell(queue.pop()):
+                    queue.clear()
+                    return False
+            return True
+        finally:
+            if self.counters:
+                self.propagation_steps += steps
+
+    def _propagate_cell(self, index: int) -> bool:
+        """Fill what a queued cell forces, returning False on a conflict."""
+        value = self.field_state.cells[index]
+        if not value:
+            candidates = self.possible_values[index]
+            return bool(candidates) and (
+                bool(candidates & (candidates - 1))
+                or self._assign(index, candidates.bit_length() - 1)
             )
+        if self._group_size[self._find(index)] < value:
+            extension = self._extension_cells(index)
+            return bool(extension) and (
+                len(extension) > 1 or self._assign(extension[0], value)
+            )
+        return True
+
+    def _undo(self, mark: int) -> None:
+        """Roll the bookkeeping back to an earlier trail length."""
+        trail = self._trail
+        field_state = self.field_state
+        while len(trail) > mark:
+            operation, index, value = trail.pop()
+            if operation == _TRAIL_DOMAIN:
+                self.possible_values[index] = value
+            elif operation == _TRAIL_UNION:
+                self._parent[index] = index
+                self._group_size[value] -= self._group_size[index]
+            else:
+                field_state.set_index(index, 0)
+
+    def _touching_groups(self, index: int) -> int:
+        """Count the distinct groups next to a cell."""
+        cells = self.field_state.cells
+        return len(
+            {
+                self._find(neighbour)
+                for neighbour in self._neighbours[index]
+                if cells[neighbour]
+            }
+        )
 
-            for neighbour in free_neighbours:
-                if any(
-                    self._connection_cells_found(n, neighbour, group)
-                    for n in self.field_state.field.get_neighbour_cells(neighbour)
-                ):
+    def _next_cell(self) -> int:
+        """Pick the cell to branch on, or -1 when the board is full."""
+        cells = self.field_state.cells
+        region = self._region
+        if self.variable_order == ORDER_STATIC:
+            for index in range(len(cells) - 1, -1, -1):
+                if not cells[index] and (region is None or region[index]):
+                    return index
+            return -1
+
+        best, best_length, best_groups = -1, 0, 0
+        for index, value in enumerate(cells):
+            if value or (region is not None and not region[index]):
+                continue
+            length = mask_count(self.possible_values[index])
+            if best < 0 or length <= best_length:
+                groups = self._touching_groups(index)
+                if best < 0 or length < best_length or groups > best_groups:
+                    best, best_length, best_groups = index, length, groups
+        return best
+
+    def _constraint_count(self, index: int, value: int) -> int:
+        """Count the neighbour candidates that placing a value would remove."""
+        cells = self.field_state.cells
+        possible_values = self.possible_values
+        removed = 0
+        for neighbour in self._neighbours[index]:
+            if not cells[neighbour]:
+                candidates = possible_values[neighbour] >> (value - 1)
+                removed += (candidates & 1) + (candidates >> 2 & 1)
+        return removed
+
+    def _ordered_values(self, index: int) -> List[int]:
+        """Order the candidates of a cell according to ``value_order``.
+
+        The static order tries unfinished group values first, in row-major
+        order of the groups, then the remaining values ascending. While a
+        component is searched only its own groups count.
+        """
+        cells = self.field_state.cells
+        mask = self.possible_values[index]
+        candidates = mask_values(mask)
+        if self.value_order == ORDER_LCV:
+            return sorted(
+                candidates,
+                key=lambda value: (self._constraint_count(index, value), value),
+            )
+        rank = {}
+        board = cells.tolist()
+        region = self._region
+        for value in candidates:
+            cell = -1
+            while True:
+                try:
+                    cell = board.index(value, cell + 1)
+                except ValueError:
+                    break
+                if region is not None and not region[cell]:
                     continue
+                if self._group_size[self._find(cell)] < value:
+                    rank[value] = cell
+                    break
+        return sorted(
+            candidates,
+            key=lambda value: (0, rank[value]) if value in rank else (1, value),
+        )
 
-                next_cells.append((neighbour, current_length + 1))
-
-    def _connection_cells_found(
-        self, neighbour: Tuple[int, int], cell: Tuple[int, int], group: CellsGroup
+    def _try_fill_empty_cells(
+        self, limit: int = 1, depth: int = 0, frames: Sequence[Sequence[Any]] = ()
     ) -> bool:
-        """Check if connection cells are found."""
-        value = group.get_value()
+        """Try to fill empty cells until ``limit`` solutions are found.
+
+        Each solution is recorded in ``solutions``; on success the last one
+        is left on the board. ``depth`` is the number of branches taken.
+        The search runs on the explicit stack ``_stack``, one frame per
+        branching cell, restored from the ``frames`` of a checkpoint if any.
+        """
+        self._stack = []
+        if self.backjump:
+            return self._backjump_search(limit, depth, frames)
+        self._restore(frames)
+        stack = self._stack
+        descend = True
+        while True:
+            if descend and self._descend(limit, depth):
+                return True
+            if not stack:
+                return False
+            frame = stack[-1]
+            if frame.value:
+                self._retract(frame)
+            descend = self._branch(frame)
+            if not descend:
+                if len(self.solutions) == frame.found:
+                    self._record_dead()
+                stack.pop()
+
+    def _descend(self, limit: int, depth: int) -> bool:
+        """Visit the current board of the search.
+
+        A full board is recorded as a solution, and True is returned once
+        there are ``limit`` of them. Otherwise a frame branching on the next
+        cell is pushed, unless the board is known to be dead.
+        """
+        self.depth = depth + len(self._stack)
+        self._check_budget()
+        cell = self._next_cell()
+        if cell < 0:
+            self.solutions.append(self.field_state.to_list())
+            return len(self.solutions) >= limit
+        if not self._is_dead():
+            self._stack.append(self._frame(cell))
+        return False
 
-        if (
-            self.field_state.get_state(neighbour) == value
-            and neighbour not in group.initial_cells
-            and neighbour not in group.possible_cells
-        ):
-            self.field_state.set_state(cell, value)
-            intersection_length = len(self.field_state.get_involved(cell))
-            self.field_state.set_state(cell, 0)
+    def _retract(self, frame: "_Frame") -> None:
+        """Take back the value last tried on a frame."""
+        self._undo(frame.mark)
+        if self.counters:
+            self.backtracks += 1
+        frame.value = 0
 
-            if intersection_length <= value:
-                group.add_connection(cell)
-                self._add_possible_value(cell, value)
+    def _backjump_search(
+        self, limit: int, depth: int, frames: Sequence[Sequence[Any]]
+    ) -> bool:
+        """Search like ``_try_fill_empty_cells`` with conflict-directed backjumping.
+
+        Decisions are numbered by level from the board the search starts
+        on. A failed subtree returns its conflict set, the levels of the
+        decisions that together leave no solution. A node whose decision is
+        not in the conflict set of a child cannot do better with another
+        value and is skipped. The conflict set of an exhausted node is
+        learned as a nogood.
+        """
+        decisions = self._decisions
+        self._root_values = list(self.possible_values)
+        self._probe = self._fork()
+        self._probe_literals = []
+        self._probe_marks = []
+        self._restore(frames)
+        stack = self._stack
+        descend = True
+        conflict: Set[int] = set()
+        while True:
+            if descend:
+                level, frames = len(decisions), len(stack)
+                if self._descend(limit, depth):
+                    return True
+                if len(stack) == frames:
+                    # A solution or a dead board blames every decision.
+                    conflict = set(range(1, level + 1))
+            if not stack:
+                return False
+            frame = stack[-1]
+            if self._jump_over(frame, conflict):
+                stack.pop()
+                descend = False
+                continue
+            descend = self._branch(frame)
+            if not descend:
+                stack.pop()
+                conflict = self._exhausted(frame)
+
+    def _jump_over(self, frame: "_Frame", conflict: Set[int]) -> bool:
+        """Take back the value last tried on a frame given the child's conflict.
+
+        Returns True if the decision of the frame is not in ``conflict``, so
+        its other values can be skipped; otherwise ``conflict`` is added to
+        the one of the frame. A frame with no value tried is left alone.
+        """
+        if not frame.value:
+            return False
+        self._retract(frame)
+        self._decisions.pop()
+        jump = frame.level + 1 not in conflict
+        if self.counters:
+            self.backjumps += jump
+        if jump:
+            if len(self.solutions) == frame.found:
+                self._record_dead()
             return True
+        frame.conflict |= conflict
+        frame.conflict.discard(frame.level + 1)
+        return False
 
+    def _exhausted(self, frame: "_Frame") -> Set[int]:
+        """Return the conflict set of a frame whose values are exhausted.
+
+        A frame with a solution below it blames every decision above it.
+        Otherwise its conflict set is learned as a nogood and its board is
+        recorded as dead.
+        """
+        if len(self.solutions) > frame.found:
+            return set(range(1, frame.level + 1))
+        conflict = frame.conflict
+        if frame.refuted and len(conflict) < frame.level:
+            conflict |= self._explain(frame.cell, frame.refuted, frame.level)
+        self._learn(conflict)
+        self._record_dead()
+        return conflict
+
+    def _frame(self, cell: int, values: Optional[Sequence[int]] = None) -> "_Frame":
+        """Return the search frame branching on a cell of the current board.
+
+        ``values`` are the ones left to try, in order, when restoring a frame.
+        """
+        if values is None:
+            values = self._ordered_values(cell)
+        frame = _Frame(
+            cell,
+            list(values)[::-1],
+            len(self._trail),
+            len(self.solutions),
+            len(self._decisions),
+        )
+        if self.backjump:
+            frame.refuted = self._root_values[cell] & ~self.possible_values[cell]
+        return frame
+
+    def _branch(self, frame: "_Frame") -> bool:
+        """Take the next value of a frame that propagation keeps.
+
+        Returns False once the values of the frame are exhausted.
+        """
+        cell = frame.cell
+        while frame.values:
+            value = frame.values.pop()
+            if self.backjump:
+                reason = self._nogood_reason(cell, value)
+                if reason is not None:
+                    if self.counters:
+                        self.nogood_prunes += 1
+                    frame.conflict |= reason
+                    continue
+                self._decisions.append((cell, value))
+            if self._assign(cell, value) and self._propagate():
+                frame.value = value
+                return True
+            frame.refuted |= 1 << value
+            self._undo(frame.mark)
+            if self.backjump:
+                self._decisions.pop()
+            if self.counters:
+                self.backtracks += 1
         return False
 
-    def _add_possible_value(self, cell: Tuple[int, int], value: int) -> None:
-        """Add a possible value to a cell."""
-        if value not in self.possible_values[cell]:
-            # self.possible_values[cell].add(value)
-            for n in self.field_state.field.get_neighbour_cells(cell):
-                n_value = self.field_state.get_state(n)
-                if n_value != 0 and abs(n_value - value) == 1:
-                    break  # Value conflicts with adjacent cell
-            else:
-                self.possible_values[cell].append(value)
+    def checkpoint(self) -> Dict[str, Any]:
+        """Return the state of a search stopped by its budget.
+
+        The checkpoint holds plain lists only, so it can be stored or sent
+        to another process and passed to ``solve`` as ``resume`` along with
+        the same board. Learned nogoods and dead boards are not kept. The
+        ``settled`` cells are the ones of the components already solved.
+        """
+        return {
+            "zobrist": self._root_hash,
+            "path": [list(branch) for branch in self._path],
+            "region": self._scope,
+            "settled": [list(cell) for cell in self._settled],
+            "frames": [
+                [
+                    frame.cell,
+                    frame.value,
+                    frame.values[::-1],
+                    sorted(frame.conflict),
+                    frame.refuted,
+                ]
+                for frame in self._stack
+            ],
+        }
+
+    def _restore(self, frames: Sequence[Sequence[Any]]) -> None:
+        """Take the branches of checkpoint frames and push the frames."""
+        for cell, value, remaining, conflict, refuted in frames:
+            frame = self._frame(cell, remaining)
+            frame.conflict = set(conflict)
+            frame.refuted = refuted
+            if self.backjump:
+                self._decisions.append((cell, value))
+            if self.field_state.cells[cell] or not (
+                self._assign(cell, value) and self._propagate()
+            ):
+                raise ValueError("Checkpoint does not match the board")
+            frame.value = value
+            self._stack.append(frame)
 
-    def _try_fill_empty_cells(self) -> None:
-        """Try to fill empty cells."""
+    def _transposition_key(self) -> Tuple[Any, int]:
+        """Return the key of the board in the transposition table.
 
-        def backtrack():
-            if not free_cells:
-                return True
-            cell = free_cells.pop()
-            possible_values[cell] = self.possible_values[cell]
-            for value in possible_values[cell]:
-                self.field_state.set_state(cell, value)
-                try:
-                    self.check_group_size()
-                    if backtrack():
-                        return True
-                except ValueError:
-                    pass
-                self.field_state.set_state(cell, 0)
-            free_cells.append(cell)
+        The board size and the values allowed in the search go along with
+        the hash, since they decide which boards are dead.
+        """
+        return self._transposition_context, self.field_state.zobrist
 
+    def _is_dead(self) -> bool:
+        """Check if the board was already proven to have no solution."""
+        if self.transpositions.max_size <= 0:
             return False
-
-        free_cells = list(
-            filter(
-                lambda c: self.field_state.get_state(c) == 0,
-                self.field_state.field.get_all_cells(),
-            )
+        dead = self._transposition_key() in self.transpositions
+        if self.counters:
+            self.transposition_lookups += 1
+            self.transposition_hits += dead
+        return dead
+
+    def _record_dead(self) -> None:
+        """Remember that the board has no solution.
+
+        Boards with an excluded cell still empty are left out: they are
+        only dead under the exclusion.
+        """
+        cells = self.field_state.cells
+        if all(cells[index] for index in self._excluded):
+            self.transpositions.add(self._transposition_key())
+
+    def _fork(self) -> "PuzzleSolver":
+        """Return a solver on a copy of the board and its bookkeeping."""
+        # pylint: disable=protected-access
+        solver = PuzzleSolver(
+            self.field_state.copy(),
+            self.propagate,
+            transposition_limit=0,
+            free_value_limit=self.free_value_limit,
         )
-        possible_values = self.possible_values
-        backtrack()
-
-    def check_group_size(self) -> None:
-        """Check if group size is correct."""
-        self._refresh_state()
-        if any(
-            group.get_possible_length() < group.get_value()
-            and not group.possible_connection_cells
-            for group in self.unfilled_groups.values()
+        solver.possible_values = list(self.possible_values)
+        solver._parent = list(self._parent)
+        solver._group_size = list(self._group_size)
+        solver._assigned_at = [0] * len(self._parent)
+        return solver
+
+    def _refutes(self, literals: List[Tuple[int, int]], index: int, mask: int) -> bool:
+        """Check if propagation rules out values of a cell under some decisions.
+
+        The decisions are replayed on the board the search started on, and
+        each value in ``mask`` is tried on top of them. The probe keeps the
+        decisions replayed last and only redoes the ones that differ.
+        """
+        # pylint: disable=protected-access
+        if not self._replay_probe(literals):
+            return True
+        probe = self._probe
+        cells = probe.field_state.cells
+        if cells[index]:
+            return not mask >> cells[index] & 1
+        for value in mask_values(mask & probe.possible_values[index]):
+            mark = len(probe._trail)
+            refuted = not (probe._assign(index, value) and probe._propagate())
+            probe._queue.clear()
+            probe._undo(mark)
+            if not refuted:
+                return False
+        return True
+
+    def _replay_probe(self, literals: List[Tuple[int, int]]) -> bool:
+        """Replay decisions on the probe, returning False if they conflict.
+
+        The decisions it shares with the ones replayed last are kept.
+        """
+        # pylint: disable=protected-access
+        probe = self._probe
+        cells = probe.field_state.cells
+        replayed = self._probe_literals
+        common = 0
+        while (
+            common < len(replayed)
+            and common < len(literals)
+            and replayed[common] == literals[common]
         ):
-            raise ValueError("Wrong group size")
+            common += 1
+        if common < len(replayed):
+            probe._queue.clear()
+            probe._undo(self._probe_marks[common])
+            del replayed[common:], self._probe_marks[common:]
+        for cell, value in literals[common:]:
+            if cells[cell]:
+                if cells[cell] != value:
+                    return False
+                continue
+            mark = len(probe._trail)
+            if not (
+                probe.possible_values[cell] >> value & 1
+                and probe._assign(cell, value)
+                and probe._propagate()
+            ):
+                probe._queue.clear()
+                probe._undo(mark)
+                return False
+            replayed.append((cell, value))
+            self._probe_marks.append(mark)
+        return True
+
+    def _explain(self, index: int, mask: int, level: int) -> Set[int]:
+        """Return the levels of decisions that rule out the values of a cell.
+
+        The decisions within ``EXPLAIN_RADIUS`` of the cell are kept if
+        propagation alone rules out every value in ``mask`` under them.
+        Otherwise every decision is blamed.
+        """
+        size = self.field_state.field.size()
+        row, column = divmod(index, size)
+        levels = [
+            position + 1
+            for position, (cell, _) in enumerate(self._decisions[:level])
+            if abs(cell // size - row) + abs(cell % size - column) <= EXPLAIN_RADIUS
+        ]
+        if len(levels) < level and self._refutes(
+            [self._decisions[position - 1] for position in levels], index, mask
+        ):
+            return set(levels)
+        return set(range(1, level + 1))
+
+    def _learn(self, conflict: Set[int]) -> None:
+        """Record the decisions of a conflict set as a nogood.
+
+        The oldest nogood is dropped once there are ``nogood_limit``.
+        """
+        if not conflict or len(conflict) > NOGOOD_MAX_SIZE or self.nogood_limit <= 0:
+            return
+        nogood = frozenset(self._decisions[level - 1] for level in conflict)
+        if nogood in self._nogoods:
+            return
+        self._nogoods[nogood] = None
+        for literal in nogood:
+            self._nogood_index.setdefault(literal, set()).add(nogood)
+        if len(self._nogoods) > self.nogood_limit:
+            oldest, _ = self._nogoods.popitem(last=False)
+            for literal in oldest:
+                self._nogood_index[literal].discard(oldest)
+
+    def _nogood_reason(self, index: int, value: int) -> Optional[Set[int]]:
+        """Return the levels behind a nogood ruling out a value, if one does.
+
+        A cell value set by propagation is blamed on every decision up to
+        the level that set it.
+        """
+        cells = self.field_state.cells
+        for nogood in self._nogood_index.get((index, value), ()):
+            if all(
+                cells[cell] == cell_value
+                for cell, cell_value in nogood
+                if cell != index
+            ):
+                reason: Set[int] = set()
+                for cell, cell_value in nogood:
+                    level = self._assigned_at[cell]
+                    if cell == index or not level:
+                        continue
+                    if self._decisions[level - 1] == (cell, cell_value):
+                        reason.add(level)
+                    else:
+                        reason.update(range(1, level + 1))
+                return reason
+        return None
 
     def check_for_zeros(self) -> bool:
         """Check if there is any zero in field state"""
-        return any(0 in sublist for sublist in self.field_state.to_list())
+        return 0 in self.field_state.cells
@@ -0,0 +1,214 @@
+"""Solver entry points for worker processes.
+
+Boards cross the process boundary as the raw bytes of the cell array
+instead of pickled FieldState objects.
+"""
+
+# pylint: disable=too-many-arguments,too-few-public-methods
+import time
+from array import array
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .puzzle_generator import PuzzleGenerator
+from .solver import (
+    FREE_VALUE_LIMIT,
+    PROGRESS_INTERVAL,
+    FieldState,
+    PuzzleSolver,
+    SolveBudgetExceeded,
+    TranspositionTable,
+)
+
+BOARD_KEYS = ("solved_puzzle", "partial_puzzle")
+
+# Dead boards found by the searches of this process, shared by its solves:
+# a board solved again with more cells filled skips the dead ends it had.
+_transpositions = TranspositionTable()
+
+# Options of the solves of this process, set by ``init_worker``: whether they
+# keep their counters and the free value limit, see ``PuzzleSolver``. A limit
+# of 0 lets regions without a clue take the whole board.
+_options = SimpleNamespace(counters=True, free_value_limit=FREE_VALUE_LIMIT)
+
+
+def init_worker(
+    transposition_limit: int,
+    counters: bool = True,
+    free_value_limit: int = FREE_VALUE_LIMIT,
+) -> None:
+    """Size the transposition table of a worker process and set its options."""
+    _options.counters = counters
+    _options.free_value_limit = free_value_limit
+    _transpositions.max_size = transposition_limit
+    _transpositions.clear()
+
+
+def pack_board(matrix: List[List[int]]) -> bytes:
+    """Pack a square board into bytes."""
+    return array("I", [value for row in matrix for value in row]).tobytes()
+
+
+def unpack_board(data: bytes) -> List[List[int]]:
+    """Unpack a board packed by ``pack_board``."""
+    return FieldState.from_bytes(data).to_list()
+
+
+def unpack_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Unpack the boards of a result returned by ``solve_board``."""
+    return {
+        key: unpack_board(value) if key in BOARD_KEYS else value
+        for key, value in result.items()
+    }
+
+
+def _free_value_limit(area: int) -> int:
+    """Return the free value limit of the solves of a board area."""
+    return _options.free_value_limit or area
+
+
+def _solver(data: bytes, **kwargs: Any) -> PuzzleSolver:
+    """Build a solver of a packed board with the options of this process."""
+    state = FieldState.from_bytes(data)
+    return PuzzleSolver(
+        state,
+        transpositions=_transpositions,
+        free_value_limit=_free_value_limit(len(state.cells)),
+        counters=_options.counters,
+        **kwargs,
+    )
+
+
+def solve_board(
+    data: bytes,
+    timeout: Optional[float] = None,
+    max_nodes: Optional[int] = None,
+    cancel: Any = None,
+    progress: Any = None,
+    progress_interval: float = PROGRESS_INTERVAL,
+    stats: bool = False,
+    path: Sequence[Tuple[int, int]] = (),
+    resume: Optional[Dict[str, Any]] = None,
+    decompose: bool = False,
+    region: Optional[Sequence[int]] = None,
+) -> Dict[str, Any]:
+    """Solve a packed board and return the result with packed boards.
+
+    Progress reports are put on the ``progress`` queue if one is given.
+    ``resume`` is the checkpoint of an earlier solve of the board cut short
+    by its budget, in any process. ``decompose`` and ``region`` are the ones
+    of ``PuzzleSolver``.
+    """
+    solver = _solver(
+        data,
+        progress=progress.put if progress is not None else None,
+        progress_interval=progress_interval,
+        decompose=decompose,
+    )
+    result = solver.solve(
+        timeout=timeout,
+        max_nodes=max_nodes,
+        cancel=cancel,
+        stats=stats,
+        path=path,
+        resume=resume,
+        region=region,
+    )
+    return {
+        key: pack_board(value) if key in BOARD_KEYS else value
+        for key, value in result.items()
+    }
+
+
+class SubtreeCancel:
+    """Stops the search of one subtree of a parallel solve.
+
+    ``cutoff`` is a shared value holding the index of the earliest subtree
+    known to hold the answer. Later subtrees stop, as does every subtree
+    once the cutoff is negative or ``cancel`` is set.
+    """
+
+    def __init__(self, cutoff: Any, index: int, cancel: Any = None):
+        """Initialize the cancellation of a subtree."""
+        self.cutoff = cutoff
+        self.index = index
+        self.cancel = cancel
+
+    def is_set(self) -> bool:
+        """Check if the subtree search should stop."""
+        return self.cutoff.value < self.index or (
+            self.cancel is not None and self.cancel.is_set()
+        )
+
+
+def split_board(data: bytes, count: int) -> List[List[Tuple[int, int]]]:
+    """Split the search tree of a packed board, see ``PuzzleSolver.split``."""
+    return _solver(data).split(count)
+
+
+def decompose_board(data: bytes) -> List[List[int]]:
+    """Split a packed board into components, see ``PuzzleSolver.components``."""
+    return _solver(data).components()
+
+
+def _timeout(deadline: Optional[float]) -> Optional[float]:
+    """Return the time left before a wall-clock deadline."""
+    return None if deadline is None else max(deadline - time.time(), 0.0)
+
+
+def solve_subtree(
+    data: bytes,
+    path: Sequence[Tuple[int, int]],
+    deadline: Optional[float],
+    max_nodes: Optional[int],
+    cancel: Any,
+) -> Dict[str, Any]:
+    """Solve a subtree of a packed board with its statistics.
+
+    The deadline is wall-clock time, since the subtree may wait in the
+    pool queue before it starts.
+    """
+    return solve_board(
+        data, _timeout(deadline), max_nodes, cancel, stats=True, path=path
+    )
+
+
+def solve_component(
+    data: bytes,
+    region: Sequence[int],
+    deadline: Optional[float],
+    max_nodes: Optional[int],
+    cancel: Any,
+) -> Dict[str, Any]:
+    """Solve one component of a packed board with its statistics.
+
+    The deadline is wall-clock time, as for ``solve_subtree``.
+    """
+    return solve_board(
+        data, _timeout(deadline), max_nodes, cancel, stats=True, region=region
+    )
+
+
+def count_subtree(
+    data: bytes,
+    path: Sequence[Tuple[int, int]],
+    limit: int,
+    deadline: Optional[float],
+    max_nodes: Optional[int],
+    cancel: Any,
+) -> Dict[str, Any]:
+    """Count the solutions of a subtree of a packed board up to a limit."""
+    solver = _solver(data)
+    try:
+        count = solver.count_solutions(
+            limit, _timeout(deadline), max_nodes, cancel, path=path
+        )
+    except SolveBudgetExceeded as excp:
+        return {"budget_exceeded": str(excp), "nodes": solver.nodes}
+    return {"count": count, "nodes": solver.nodes}
+
+
+def generate_board(size: int, filled_percentage: float, unique: bool = False) -> bytes:
+    """Generate a puzzle and return it packed."""
+    generator = PuzzleGenerator(size, _free_value_limit(size * size))
+    return pack_board(generator.generate_puzzle(filled_percentage, unique))
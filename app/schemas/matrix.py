@@ -1,10 +1,18 @@
 """This module contains the schemas for the matrix model."""
 
 # pylint: disable=too-few-public-methods
-from typing import List
+from typing import Annotated, List, Optional
 
 from pydantic import BaseModel, Field
 
+from app.config import solver_settings
+
+# Rows of a board to solve, at most SOLVE_MAX_SIZE cells wide and high.
+BoardRows = Annotated[
+    List[Annotated[List[int], Field(max_length=solver_settings.SOLVE_MAX_SIZE)]],
+    Field(max_length=solver_settings.SOLVE_MAX_SIZE),
+]
+
 
 class CreateMatrix(BaseModel):
     """Create matrix schema."""
@@ -35,7 +43,44 @@ class ShowMatrix(BaseModel):
 class SolveMatrix(BaseModel):
     """Solve matrix schema."""
 
-    rows: List[List[int]]
+    rows: BoardRows
+
+    class ConfigDict:
+        """Config dict."""
+
+        from_attributes = True
+
+
+class SolveBatch(BaseModel):
+    """Solve batch schema."""
+
+    boards: List[BoardRows] = Field(
+        ..., min_length=1, max_length=solver_settings.SOLVE_BATCH_LIMIT
+    )
+
+    class ConfigDict:
+        """Config dict."""
+
+        from_attributes = True
+
+
+class SolveBatchItem(BaseModel):
+    """Result of one board of a solve batch."""
+
+    index: int
+    id: Optional[int] = None
+    coordinates: Optional[List[List[int]]] = None
+    error: Optional[str] = None
+
+
+class SolveJobStatus(BaseModel):
+    """Status of a background solve job."""
+
+    id: str
+    status: str
+    matrix: Optional[ShowMatrix] = None
+    error: Optional[str] = None
+    budget_exceeded: Optional[str] = None
 
     class ConfigDict:
         """Config dict."""
@@ -46,8 +91,9 @@ class SolveMatrix(BaseModel):
 class GenerateMatrix(BaseModel):
     """Generate matrix schema."""
 
-    size: int = Field(6, gt=0, le=10)
+    size: int = Field(6, gt=0, le=solver_settings.GENERATE_MAX_SIZE)
     filled_percentage: float = Field(0.5, gt=0, le=1)
+    unique: bool = False
 
     class ConfigDict:
         """Config dict."""
@@ -0,0 +1,33 @@
+"""Test the benchmark corpus and the regression check"""
+
+from benchmarks import corpus, runner
+
+
+def test_corpus():
+    """Test that the stored corpus covers its sizes and known outcomes"""
+    cases = corpus.load_corpus()["cases"]
+    assert {case["size"] for case in cases} >= set(corpus.SIZES)
+    assert {case["expected"] for case in cases} == {"solved", "unsolvable"}
+    assert len({case["name"] for case in cases}) == len(cases)
+
+
+def test_compare_regressions():
+    """Test that larger or wrong results are reported, and slower ones on request"""
+    cases = [case for case in corpus.load_corpus()["cases"] if case["size"] == 5]
+    results = runner.run(cases, ["static", "mrv"], repeat=1, max_nodes=100)
+    assert all(item["correct"] for item in results)
+    assert not runner.compare(results, results)
+
+    baseline = [dict(item) for item in results]
+    baseline[0]["seconds"] = results[0]["seconds"] / 2 - runner.MIN_SECONDS
+    baseline[1]["nodes"] = results[1]["nodes"] // 2
+    baseline[2]["outcome"] = "max_nodes"
+    slower = dict(results[3], correct=False)
+    regressions = runner.compare(results[:3] + [slower], baseline)
+    assert [regression.split(":")[1].split()[0] for regression in regressions] == [
+        "nodes",
+        "outcome",
+        "wrong",
+    ]
+    regressions = runner.compare(results[:3] + [slower], baseline, seconds=True)
+    assert regressions[0].split(":")[1].split()[0] == "seconds"
@@ -1,9 +1,21 @@
 """Test the server routes"""
 
+import asyncio
+import json
+import os
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
 from starlette import status
 
+from app.config import profiling_settings, solver_settings
+from app.db import get_async_session
+from app.main import app
+from app.models import Matrix
+from app.orm import board as board_orm, solution as solution_orm
+from app.workers import solver_pool
+
 
 @pytest.mark.parametrize(
     "payload, status_code, result",
@@ -116,6 +128,11 @@ async def test_solve_puzzle_invalid_value(
             status.HTTP_400_BAD_REQUEST,
             {"detail": "Minimum field size is 2"},
         ),
+        (
+            {"rows": [[1, 0, 2], [0, 0], [0, 0, 1]]},
+            status.HTTP_400_BAD_REQUEST,
+            {"detail": "Field should be square"},
+        ),
     ),
 )
 async def test_solve_puzzle_invalid_size(
@@ -128,6 +145,38 @@ async def test_solve_puzzle_invalid_size(
     assert response.status_code == status_code
 
 
+async def test_solve_large_free_region(async_client: AsyncClient, user_token):
+    """Test that regions without a clue may grow past 9 cells"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    rows = [[0, 0, 0, 0], [0, 2, 0, 0], [3, 0, 0, 0], [0, 0, 0, 0]]
+    resp = await async_client.post("/api/solve", json={"rows": rows}, headers=headers)
+    assert resp.status_code == status.HTTP_200_OK
+    assert max(value for row in resp.json()["coordinates"] for value in row) > 9
+
+
+async def test_board_size_limits(async_client: AsyncClient, user_token):
+    """Test that boards past the configured sizes are rejected"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    size = solver_settings.SOLVE_MAX_SIZE + 1
+    response = await async_client.post(
+        "/api/solve", json={"rows": [[0] * size] * size}, headers=headers
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = await async_client.post(
+        "/api/solve", json={"rows": [[0] * size, [0, 0]]}, headers=headers
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    for params in (
+        {"size": solver_settings.GENERATE_MAX_SIZE + 1, "filled_percentage": 0.5},
+        {"size": 0, "filled_percentage": 0.5},
+        {"size": 5, "filled_percentage": 1.5},
+    ):
+        response = await async_client.get(
+            "/api/generate", params=params, headers=headers
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 @pytest.mark.parametrize(
     "payload, status_code, board_size",
     (
@@ -136,6 +185,11 @@ async def test_solve_puzzle_invalid_size(
             status.HTTP_200_OK,
             5,
         ),
+        (
+            {"size": 6, "filled_percentage": 0.3, "unique": True},
+            status.HTTP_200_OK,
+            6,
+        ),
     ),
 )
 async def test_generate_test_data(
@@ -149,3 +203,300 @@ async def test_generate_test_data(
     assert "coordinates" in data
     test_board = data["coordinates"]
     assert len(test_board) == board_size
+
+    resp = await async_client.get("/api/generate/pool", headers=headers)
+    assert resp.status_code == status.HTTP_200_OK
+    buckets = {
+        (bucket["size"], bucket["unique"]): bucket for bucket in resp.json()["buckets"]
+    }
+    assert buckets[(board_size, payload.get("unique", False))]["fallbacks"] >= 1
+
+
+@pytest.mark.parametrize(
+    "payload, status_code, results",
+    (
+        (
+            {
+                "boards": [
+                    [
+                        [1, 0, 2, 0, 0],
+                        [0, 5, 0, 0, 0],
+                        [1, 0, 0, 0, 4],
+                        [0, 0, 1, 0, 0],
+                        [0, 0, 7, 0, 1],
+                    ],
+                    [[1, 0, 2, 0, 0]],
+                    [[2, 0], [0, 1]],
+                    [[1, 0, 2], [0, 0]],
+                ]
+            },
+            status.HTTP_200_OK,
+            [
+                [
+                    [1, 5, 2, 2, 4],
+                    [5, 5, 5, 7, 4],
+                    [1, 3, 5, 7, 4],
+                    [3, 3, 1, 7, 4],
+                    [7, 7, 7, 7, 1],
+                ],
+                "Minimum field size is 2",
+                "Puzzle is unsolvable",
+                "Field should be square",
+            ],
+        ),
+    ),
+)
+async def test_solve_batch(
+    async_client: AsyncClient, user_token, payload, status_code, results
+):
+    """Test solving a batch of puzzles"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    resp = await async_client.post("/api/solve/batch", json=payload, headers=headers)
+    assert resp.status_code == status_code
+    data = resp.json()
+    assert [item["index"] for item in data] == [0, 1, 2, 3]
+    assert data[0]["coordinates"] == results[0]
+    assert data[0]["id"] is not None
+    assert [item["error"] for item in data[1:]] == results[1:]
+    assert [item["id"] for item in data[1:]] == [None, None, None]
+
+    resp = await async_client.post(
+        "/api/solve/batch/stream", json=payload, headers=headers
+    )
+    assert resp.status_code == status_code
+    *items, summary = [json.loads(line) for line in resp.text.splitlines()]
+    assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+    assert summary["ids"][0] is not None
+    assert summary["ids"][1:] == [None, None, None]
+
+
+async def test_solution_store(async_client: AsyncClient, user_token):
+    """Test that solve results are stored once and reused"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    rows = [[2, 0, 0], [0, 0, 0], [0, 0, 1]]
+    responses = [
+        await async_client.post("/api/solve", json={"rows": rows}, headers=headers)
+        for _ in range(2)
+    ]
+    assert [resp.status_code for resp in responses] == [200, 200]
+    first, second = (resp.json() for resp in responses)
+    assert first["coordinates"] == second["coordinates"]
+    assert first["id"] != second["id"]
+
+    unsolvable = [[2, 0], [0, 1]]
+    resp = await async_client.post(
+        "/api/solve", json={"rows": unsolvable}, headers=headers
+    )
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+    async for db in app.dependency_overrides[get_async_session]():
+        assert await solution_orm.get_solution(rows, db) == {
+            "solved_puzzle": first["coordinates"]
+        }
+        assert await solution_orm.get_solution(unsolvable, db) == {
+            "error": "Puzzle is unsolvable"
+        }
+        matrices = await db.scalars(
+            select(Matrix).filter(Matrix.id.in_([first["id"], second["id"]]))
+        )
+        assert len({matrix.board_id for matrix in matrices}) == 1
+
+
+async def test_board_store_conflicts(monkeypatch):
+    """Test storing boards partly stored by a concurrent batch"""
+    boards = [[[4, 4], [4, 4]], [[4, 4, 4], [4, 1, 3], [3, 3, 1]]]
+    get_boards = board_orm.get_boards
+    reads = []
+
+    async def stale_get_boards(digests, db):
+        reads.append(list(digests))
+        return {} if len(reads) == 1 else await get_boards(digests, db)
+
+    async for db in app.dependency_overrides[get_async_session]():
+        (existing,) = await board_orm.get_or_create_boards(boards[:1], db)
+        await db.commit()
+        monkeypatch.setattr(board_orm, "get_boards", stale_get_boards)
+        stored = await board_orm.get_or_create_boards(boards, db)
+        await db.commit()
+    assert len(reads) == 2
+    assert stored[0].id == existing.id
+    assert [board.coordinates for board in stored] == boards
+
+
+async def test_solution_store_conflict():
+    """Test that a result stored twice keeps the first and ends the transaction"""
+    rows = [[6, 0, 0], [0, 0, 0], [0, 0, 6]]
+    result = {"error": "Puzzle is unsolvable"}
+    async for db in app.dependency_overrides[get_async_session]():
+        assert await solution_orm.create_solution(rows, result, db) is not None
+        assert await solution_orm.create_solution(rows, result, db) is None
+        assert not db.in_transaction()
+        assert await solution_orm.get_solution(rows, db) == result
+
+
+async def test_solve_cache_before_store(
+    async_client: AsyncClient, user_token, monkeypatch
+):
+    """Test that repeated boards are answered from the cache, not the database"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    lookups = []
+    get_solution = solution_orm.get_solution
+
+    async def counted_get_solution(rows, db):
+        lookups.append(rows)
+        return await get_solution(rows, db)
+
+    monkeypatch.setattr(solution_orm, "get_solution", counted_get_solution)
+    solver_pool.cache.clear()
+    rows = [[0, 0, 0, 3], [0, 0, 0, 0], [0, 0, 0, 0], [1, 0, 0, 0]]
+    responses = [
+        await async_client.post("/api/solve", json={"rows": rows}, headers=headers)
+        for _ in range(2)
+    ]
+    assert [resp.status_code for resp in responses] == [200, 200]
+    assert lookups == [rows]
+
+
+async def test_solve_jobs(async_client: AsyncClient, user_token):
+    """Test solving a board as a background job"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    rows = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    rows.append([0, 0, 7, 0, 1])
+    resp = await async_client.post(
+        "/api/solve/jobs", json={"rows": rows}, headers=headers
+    )
+    assert resp.status_code == status.HTTP_202_ACCEPTED
+    job = resp.json()
+    assert job["status"] in ("queued", "running", "done")
+    for _ in range(100):
+        resp = await async_client.get(f"/api/solve/jobs/{job['id']}", headers=headers)
+        if resp.json()["status"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.05)
+    data = resp.json()
+    assert data["status"] == "done"
+    assert data["matrix"]["coordinates"][0] == [1, 5, 2, 2, 4]
+
+    resp = await async_client.delete(f"/api/solve/jobs/{job['id']}", headers=headers)
+    assert resp.json()["status"] == "done"
+    resp = await async_client.get("/api/solve/jobs/unknown", headers=headers)
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+    resp = await async_client.post(
+        "/api/solve/jobs", json={"rows": [[1]]}, headers=headers
+    )
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+
+async def test_solve_stream(async_client: AsyncClient, user_token):
+    """Test streaming the progress of a solve as Server-Sent Events"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    rows = [[0, 0, 0, 0, 5, 0], [5, 0, 0, 0, 0, 1], [0, 0, 0, 0, 0, 0]]
+    rows += [[0, 0, 6, 0, 0, 0], [4, 0, 0, 0, 0, 0], [0, 3, 0, 0, 2, 0]]
+    resp = await async_client.get(
+        "/api/solve/stream", params={"rows": json.dumps(rows)}, headers=headers
+    )
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (event[len("event: ") :], json.loads(data[len("data: ") :]))
+        for event, data in (
+            block.split("\n") for block in resp.text.strip().split("\n\n")
+        )
+    ]
+    *progress, (last, solution) = events
+    assert progress[0][0] == "progress"
+    assert progress[0][1]["nodes"] == 1
+    assert last == "solution"
+    assert solution["coordinates"][0] == [5, 5, 5, 3, 5, 5]
+
+    resp = await async_client.get(
+        "/api/solve/stream",
+        params={"rows": json.dumps([[2, 0], [0, 1]])},
+        headers=headers,
+    )
+    assert resp.text.startswith("event: error")
+    resp = await async_client.get(
+        "/api/solve/stream", params={"rows": "[[1"}, headers=headers
+    )
+    assert resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_metrics(async_client: AsyncClient, user_token):
+    """Test the Prometheus metrics of requests, solves and inserts"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    rows = [[3, 0, 0], [0, 0, 0], [0, 1, 0]]
+    resp = await async_client.post("/api/solve", json={"rows": rows}, headers=headers)
+    assert resp.status_code == status.HTTP_200_OK
+    batch = {"boards": [rows]}
+    resp = await async_client.post("/api/solve/batch", json=batch, headers=headers)
+    assert resp.status_code == status.HTTP_200_OK
+    resp = await async_client.get("/metrics")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["content-type"].startswith("text/plain")
+    lines = resp.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(
+        line.startswith(
+            'http_request_duration_seconds_count{method="POST",route="/api/solve",'
+            'status="200"}'
+        )
+        for line in lines
+    )
+    assert any(
+        line.startswith(
+            'solver_solve_duration_seconds_bucket{size="3",outcome="solved"'
+        )
+        for line in lines
+    )
+    assert any(
+        line.startswith('db_query_duration_seconds_count{operation="create_matrix"}')
+        for line in lines
+    )
+    assert any(
+        line.startswith('db_query_duration_seconds_count{operation="create_matrices"}')
+        for line in lines
+    )
+
+
+async def test_profile_requests(
+    async_client: AsyncClient, user_token, monkeypatch, tmp_path
+):
+    """Test profiling single solve and generate requests"""
+    monkeypatch.setattr(profiling_settings, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling_settings, "PROFILE_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {user_token}"}
+    rows = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    rows.append([0, 0, 7, 0, 1])
+    resp = await async_client.post(
+        "/api/solve",
+        json={"rows": rows},
+        headers={**headers, "X-Profile-Token": "wrong"},
+    )
+    assert resp.status_code == status.HTTP_403_FORBIDDEN
+
+    resp = await async_client.post(
+        "/api/solve",
+        json={"rows": rows},
+        headers={**headers, "X-Profile-Token": "secret"},
+    )
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["coordinates"][0] == [1, 5, 2, 2, 4]
+    path = resp.headers["X-Profile-Path"]
+    assert sorted(os.listdir(path)) == [
+        "input.json",
+        "profile.pstats",
+        "samples.folded",
+        "stats.txt",
+    ]
+    with open(os.path.join(path, "input.json"), encoding="utf-8") as file:
+        assert json.load(file)["input"] == rows
+
+    resp = await async_client.get(
+        "/api/generate",
+        params={"size": 5, "filled_percentage": 0.5},
+        headers={**headers, "X-Profile-Token": "secret", "X-Profile-Output": "inline"},
+    )
+    assert resp.status_code == status.HTTP_200_OK
+    assert "X-Profile-Path" not in resp.headers
+    assert "generate_puzzle" in resp.json()["profile"]["stats"]
+    assert len(os.listdir(tmp_path)) == 1
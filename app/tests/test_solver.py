@@ -0,0 +1,640 @@
+"""Test the puzzle solver engine"""
+
+import json
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+from app.puzzle_solver import (
+    FieldState,
+    PuzzleGenerator,
+    PuzzleSolver,
+    SolutionCache,
+    TranspositionTable,
+    tasks,
+)
+from app.puzzle_solver.solver import (
+    TRANSPOSITION_LIMIT,
+    Field,
+    mask_values,
+    neighbour_table,
+)
+
+
+@pytest.mark.parametrize(
+    "matrix",
+    (
+        [[1, 0], [0, 2]],
+        [
+            [1, 0, 2, 0, 0],
+            [0, 5, 0, 0, 0],
+            [1, 0, 0, 0, 4],
+            [0, 0, 1, 0, 0],
+            [0, 0, 7, 0, 1],
+        ],
+    ),
+)
+def test_state_round_trip(matrix):
+    """Test converting a matrix to a state and back"""
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert state.to_list() == matrix
+    assert state.get_state((1, 1)) == matrix[1][1]
+
+
+@pytest.mark.parametrize(
+    "matrix, error",
+    (
+        ([[1, 0, 2]], "Minimum field size is 2"),
+        ([[1, 0], [0]], "Field should be square"),
+        ([[1, 0], [0, 0, 2]], "Field should be square"),
+    ),
+)
+def test_state_from_invalid_list(matrix, error):
+    """Test that malformed boards give an error instead of raising"""
+    assert FieldState.from_list_to_state(matrix) == {"error": error}
+
+
+@pytest.mark.parametrize(
+    "size, cell, neighbours",
+    (
+        (3, (0, 0), {(1, 0), (0, 1)}),
+        (3, (1, 1), {(0, 1), (2, 1), (1, 0), (1, 2)}),
+        (4, (3, 2), {(2, 2), (3, 1), (3, 3)}),
+    ),
+)
+def test_neighbour_cells(size, cell, neighbours):
+    """Test neighbour lookup from the shared tables"""
+    field = Field(size)
+    assert set(field.get_neighbour_cells(cell)) == neighbours
+    assert Field(size).neighbours is neighbour_table(size)
+
+
+@pytest.mark.parametrize(
+    "matrix, result",
+    (
+        (
+            [
+                [1, 0, 2, 0, 0],
+                [0, 5, 0, 0, 0],
+                [1, 0, 0, 0, 4],
+                [0, 0, 1, 0, 0],
+                [0, 0, 7, 0, 1],
+            ],
+            {
+                "solved_puzzle": [
+                    [1, 5, 2, 2, 4],
+                    [5, 5, 5, 7, 4],
+                    [1, 3, 5, 7, 4],
+                    [3, 3, 1, 7, 4],
+                    [7, 7, 7, 7, 1],
+                ]
+            },
+        ),
+        ([[1, 1], [0, 0]], {"error": "Wrong group size"}),
+        ([[5, 0], [0, 0]], {"error": "Wrong group size"}),
+        ([[2, 0], [0, 1]], {"error": "Puzzle is unsolvable"}),
+        ([[0, 0, 0], [0, 0, 1], [2, 5, 0]], {"error": "Puzzle is unsolvable"}),
+    ),
+)
+def test_solve(matrix, result):
+    """Test solving boards directly with the engine"""
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert PuzzleSolver(state).solve() == result
+
+
+def test_solve_huge_clue():
+    """Test that a clue above the board area is rejected before the search"""
+    matrix = [[0] * 10 for _ in range(10)]
+    matrix[0][0] = 10**8
+    state = FieldState.from_list_to_state(matrix)["state"]
+    started = time.perf_counter()
+    assert PuzzleSolver(state).solve(timeout=5) == {"error": "Wrong group size"}
+    assert time.perf_counter() - started < 1
+
+
+def propagated(matrix):
+    """Propagate a board, returning the solver and whether it is consistent"""
+    # pylint: disable=protected-access
+    solver = PuzzleSolver(FieldState.from_list_to_state(matrix)["state"])
+    solver._refresh_state()
+    return solver, solver._consistent and solver._propagate()
+
+
+def test_propagate_forced_cells():
+    """Test that cells left with a single candidate or extension are filled"""
+    solver, consistent = propagated([[0, 3, 0], [3, 3, 0], [0, 0, 0]])
+    assert consistent
+    assert solver.field_state.to_list() == [[1, 3, 0], [3, 3, 0], [0, 0, 0]]
+    solver, consistent = propagated([[3, 0], [1, 0]])
+    assert consistent
+    assert solver.field_state.to_list() == [[3, 3], [1, 3]]
+
+
+def test_propagate_walls():
+    """Test that a finished group walls off its value and the adjacent ones"""
+    # pylint: disable=protected-access
+    solver, consistent = propagated([[2, 0, 0], [0, 0, 0], [0, 0, 0]])
+    assert consistent
+    assert solver._assign(1, 2) and solver._propagate()
+    for index in (2, 3, 4):
+        assert mask_values(solver.possible_values[index]) == list(range(4, 9))
+    assert mask_values(solver.possible_values[5]) == list(range(1, 9))
+
+
+@pytest.mark.parametrize(
+    "matrix",
+    ([[3, 1], [1, 0]], [[0, 3, 0], [1, 0, 1], [0, 0, 0]]),
+)
+def test_propagate_contradiction(matrix):
+    """Test that a group left without room to grow is a contradiction"""
+    _, consistent = propagated(matrix)
+    assert not consistent
+
+
+@pytest.mark.parametrize("variable_order", ("static", "mrv"))
+@pytest.mark.parametrize("value_order", ("static", "lcv"))
+def test_solve_orderings(variable_order, value_order):
+    """Test that every search ordering finds the unique solution"""
+    matrix = [
+        [0, 0, 0, 0, 5, 0],
+        [5, 0, 0, 0, 0, 1],
+        [0, 0, 0, 0, 0, 0],
+        [0, 0, 6, 0, 0, 0],
+        [4, 0, 0, 0, 0, 0],
+        [0, 3, 0, 0, 2, 0],
+    ]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, variable_order=variable_order, value_order=value_order)
+    assert solver.solve() == {
+        "solved_puzzle": [
+            [5, 5, 5, 3, 5, 5],
+            [5, 1, 5, 3, 5, 1],
+            [1, 4, 1, 3, 5, 5],
+            [4, 4, 6, 6, 2, 2],
+            [4, 1, 3, 6, 6, 6],
+            [1, 3, 3, 6, 2, 2],
+        ]
+    }
+
+
+def test_label_regions():
+    """Test labelling all regions of a board in one pass"""
+    state = FieldState.from_list_to_state(
+        [
+            [1, 5, 2, 2],
+            [5, 5, 0, 0],
+            [1, 3, 0, 4],
+            [3, 3, 1, 4],
+        ]
+    )["state"]
+    regions = state.label_regions()
+    assert len(regions.sizes) == 8
+    assert regions.get_size((1, 1)) == 3
+    assert regions.get_size((1, 2)) == 3
+    assert regions.get_label((0, 0)) != regions.get_label((2, 0))
+    assert sorted(regions.get_cells(regions.get_label((3, 0)))) == [
+        (2, 1),
+        (3, 0),
+        (3, 1),
+    ]
+    assert sorted(state.get_involved((0, 2))) == [(0, 2), (0, 3)]
+
+
+@pytest.mark.parametrize("nogood_limit", (0, 1, 2000))
+def test_backjump_search(nogood_limit):
+    """Test that backjumping finds the solutions of the chronological search"""
+    matrix = [
+        [2, 0, 0, 0, 0, 2, 2, 0],
+        [0, 5, 0, 1, 0, 0, 0, 0],
+        [2, 0, 7, 0, 0, 4, 4, 0],
+        [0, 7, 7, 0, 0, 4, 0, 0],
+        [4, 0, 0, 1, 9, 2, 0, 0],
+        [9, 0, 9, 0, 0, 7, 0, 7],
+        [4, 0, 9, 0, 0, 7, 7, 7],
+        [0, 0, 4, 1, 0, 0, 7, 0],
+    ]
+    solver = PuzzleSolver(
+        FieldState.from_list_to_state(matrix)["state"],
+        backjump=True,
+        nogood_limit=nogood_limit,
+    )
+    result = solver.solve(stats=True)
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert result["solved_puzzle"] == PuzzleSolver(state).solve()["solved_puzzle"]
+    assert result["stats"]["backjumps"] > 0
+    assert result["stats"]["nogoods"] <= nogood_limit
+
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, backjump=True, nogood_limit=nogood_limit)
+    assert solver.count_solutions(limit=20) == 10
+    assert state.to_list() == matrix
+    chronological = PuzzleSolver(state)
+    chronological.count_solutions(limit=20)
+    assert sorted(solver.solutions) == sorted(chronological.solutions)
+    state = FieldState.from_list_to_state([[0, 0, 0], [0, 0, 1], [2, 5, 0]])["state"]
+    assert "solved_puzzle" not in PuzzleSolver(state, backjump=True).solve()
+
+
+def test_zobrist_hash():
+    """Test that the incremental hash follows the board"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    state = FieldState.from_list_to_state(matrix)["state"]
+    board_hash = state.zobrist
+    copy = state.copy()
+    assert copy.zobrist == board_hash
+    copy.set_state((0, 1), 1)
+    assert copy.zobrist != board_hash
+    copy.set_index(1, 0)
+    assert copy.zobrist == board_hash
+    assert FieldState.from_bytes(state.to_bytes()).zobrist == board_hash
+    PuzzleSolver(copy).solve()
+    assert copy.zobrist == FieldState.from_bytes(copy.to_bytes()).zobrist
+
+
+def test_transposition_table():
+    """Test that dead boards found by one search prune a later one"""
+    matrix = [
+        [2, 0, 0, 0, 0, 2, 2, 0],
+        [0, 5, 0, 1, 0, 0, 0, 0],
+        [2, 0, 7, 0, 0, 4, 4, 0],
+        [0, 7, 7, 0, 0, 4, 0, 0],
+        [4, 0, 0, 1, 9, 2, 0, 0],
+        [9, 0, 9, 0, 0, 7, 0, 7],
+        [4, 0, 9, 0, 0, 7, 7, 7],
+        [0, 0, 4, 1, 0, 0, 7, 0],
+    ]
+    table = TranspositionTable()
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solution = PuzzleSolver(state, transpositions=table).solve()["solved_puzzle"]
+    assert len(table) > 0
+    matrix[1][0] = solution[1][0]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    fresh = PuzzleSolver(state, transposition_limit=0)
+    assert fresh.solve()["solved_puzzle"] == solution
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, transpositions=table)
+    stats = solver.solve(stats=True)["stats"]
+    assert solver.field_state.to_list() == solution
+    assert stats["transposition_hits"] > 0
+    assert stats["nodes"] < fresh.nodes
+    assert table.stats()["hit_rate"] > 0
+
+    matrix = [[0, 0, 4, 8, 0, 8], [0, 4, 4, 8, 0, 9], [6, 0, 8, 0, 0, 0]]
+    matrix += [[0, 0, 0, 6, 0, 0], [9, 0, 0, 0, 9, 9], [0, 0, 0, 9, 0, 0]]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, transpositions=TranspositionTable(1))
+    assert "solved_puzzle" not in solver.solve()
+    assert len(solver.transpositions) == 1
+    assert "solved_puzzle" not in solver.solve(stats=True)
+    assert solver.nodes == solver.transposition_hits == 1
+
+
+def test_free_value_limit():
+    """Test that regions without a clue may grow up to the limit"""
+    matrix = [[0, 0, 0, 0], [0, 2, 0, 0], [3, 0, 0, 0], [0, 0, 0, 0]]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert "solved_puzzle" not in PuzzleSolver(state).solve()
+    solver = PuzzleSolver(state, free_value_limit=16)
+    solution = solver.solve()["solved_puzzle"]
+    assert max(value for row in solution for value in row) > 9
+    regions = FieldState.from_list_to_state(solution)["state"].label_regions()
+    assert all(size == value for size, value in zip(regions.sizes, regions.values))
+    with pytest.raises(ValueError):
+        PuzzleSolver(state, free_value_limit=0)
+
+
+@pytest.mark.parametrize(
+    "budget, reason",
+    (
+        ({"max_nodes": 1}, "max_nodes"),
+        ({"timeout": 0}, "timeout"),
+        ({"cancel": threading.Event()}, "cancelled"),
+    ),
+)
+def test_solve_budget_exceeded(budget, reason):
+    """Test that a spent budget is reported apart from unsolvable boards"""
+    matrix = [
+        [7, 0, 0, 0, 4],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+        [5, 0, 0, 0, 5],
+    ]
+    if "cancel" in budget:
+        budget["cancel"].set()
+    state = FieldState.from_list_to_state(matrix)["state"]
+    result = PuzzleSolver(state).solve(**budget)
+    assert result["error"] == "Solve budget exceeded"
+    assert result["budget_exceeded"] == reason
+    assert len(result["partial_puzzle"]) == 5
+    assert state.to_list() == matrix
+
+
+@pytest.mark.parametrize("backjump", (False, True))
+def test_solve_resume(backjump):
+    """Test that a search stopped by its budget resumes from its checkpoint"""
+    matrix = [
+        [2, 0, 0, 0, 0, 2, 2, 0],
+        [0, 5, 0, 1, 0, 0, 0, 0],
+        [2, 0, 7, 0, 0, 4, 4, 0],
+        [0, 7, 7, 0, 0, 4, 0, 0],
+        [4, 0, 0, 1, 9, 2, 0, 0],
+        [9, 0, 9, 0, 0, 7, 0, 7],
+        [4, 0, 9, 0, 0, 7, 7, 7],
+        [0, 0, 4, 1, 0, 0, 7, 0],
+    ]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, backjump=backjump, transposition_limit=0)
+    solution = solver.solve()["solved_puzzle"]
+    nodes = solver.nodes
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, backjump=backjump, transposition_limit=0)
+    result = solver.solve(max_nodes=100)
+    checkpoint = json.loads(json.dumps(result["checkpoint"]))
+    assert checkpoint["frames"]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    resumed = PuzzleSolver(state, backjump=backjump, transposition_limit=0)
+    assert resumed.solve(resume=checkpoint)["solved_puzzle"] == solution
+    assert solver.nodes + resumed.nodes == nodes + 1
+    state = FieldState.from_list_to_state(matrix)["state"]
+    zobrist = state.zobrist
+    corrupted = json.loads(json.dumps(checkpoint))
+    assert len(corrupted["frames"]) > 1
+    corrupted["frames"][-1][0] = corrupted["frames"][0][0]
+    result = PuzzleSolver(state, backjump=backjump).solve(resume=corrupted)
+    assert result == {"error": "Checkpoint does not match the board"}
+    assert state.to_list() == matrix
+    assert state.zobrist == zobrist
+    assert PuzzleSolver(state).solve()["solved_puzzle"] == solution
+    matrix[0][1] = 1
+    state = FieldState.from_list_to_state(matrix)["state"]
+    result = PuzzleSolver(state).solve(resume=checkpoint)
+    assert result == {"error": "Checkpoint does not match the board"}
+
+
+def test_solve_components():
+    """Test that walled off areas of the board are searched one by one"""
+    matrix = [[0] * 6 for _ in range(6)]
+    matrix[2] = [2, 2, 4, 4, 4, 4]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state.copy(), decompose=True, transposition_limit=0)
+    components = solver.components()
+    assert components == [list(range(12)), list(range(18, 36))]
+    result = solver.solve(stats=True)
+    assert result["stats"]["components"] == 2
+    solution = result["solved_puzzle"]
+    for component in components:
+        alone = PuzzleSolver(state.copy()).solve(region=component)["solved_puzzle"]
+        for index in component:
+            x, y = divmod(index, 6)
+            assert alone[x][y] == solution[x][y]
+    nodes = solver.nodes
+    solver = PuzzleSolver(state.copy(), decompose=True, transposition_limit=0)
+    checkpoint = json.loads(json.dumps(solver.solve(max_nodes=40)["checkpoint"]))
+    assert len(checkpoint["settled"]) == len(components[0])
+    resumed = PuzzleSolver(state, decompose=True, transposition_limit=0)
+    assert resumed.solve(resume=checkpoint)["solved_puzzle"] == solution
+    assert solver.nodes + resumed.nodes == nodes + 1
+    matrix[0][4:] = [5, 2]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert PuzzleSolver(state).solve(max_nodes=1000)["budget_exceeded"]
+    solver = PuzzleSolver(state, decompose=True)
+    assert solver.solve(max_nodes=1000) == {"error": "Puzzle is unsolvable"}
+    assert solver.nodes < 10
+
+
+def test_solve_deep_search():
+    """Test that the search depth is not bound by the recursion limit"""
+    state = FieldState.from_list_to_state([[0] * 40 for _ in range(40)])["state"]
+    solver = PuzzleSolver(state, propagate=False)
+    result = solver.solve(max_nodes=1200)
+    assert result["budget_exceeded"] == "max_nodes"
+    assert solver.depth > sys.getrecursionlimit()
+
+
+def test_solve_progress():
+    """Test that progress is reported at budget checks and throttled"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    reports = []
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state, progress=reports.append, progress_interval=0)
+    assert "solved_puzzle" in solver.solve()
+    assert len(reports) == (solver.nodes - 1) // 64 + 1
+    assert reports[0]["nodes"] == 1
+    assert reports[0]["depth"] == 0
+    assert reports[0]["propagated"] == sum(
+        not clue and value > 0
+        for clues, row in zip(matrix, reports[0]["partial_puzzle"])
+        for clue, value in zip(clues, row)
+    )
+    reports.clear()
+    solver = PuzzleSolver(state, progress=reports.append, progress_interval=60)
+    solver.solve()
+    assert len(reports) == 1
+
+
+def test_solve_stats():
+    """Test the counters and phase timings returned with the result"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    solver = PuzzleSolver(FieldState.from_list_to_state(matrix)["state"])
+    stats = solver.solve(stats=True)["stats"]
+    assert stats["nodes"] == solver.nodes > 1
+    assert stats["backtracks"] > 0
+    assert stats["refreshes"] == 1
+    assert stats["propagations"] >= stats["nodes"]
+    assert stats["propagation_steps"] > stats["propagations"]
+    assert stats["flood_fills"] > 0
+    assert set(stats["timings"]) == {"refresh", "propagate", "search"}
+    assert "stats" not in solver.solve()
+
+
+def test_solve_without_counters():
+    """Test that switching the counters off keeps the solution and the nodes"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    state = FieldState.from_list_to_state(matrix)["state"]
+    counted = PuzzleSolver(state.copy(), backjump=True).solve(stats=True)
+    solver = PuzzleSolver(state, backjump=True, counters=False)
+    result = solver.solve(stats=True)
+    assert result["solved_puzzle"] == counted["solved_puzzle"]
+    stats = result["stats"]
+    assert stats["nodes"] == counted["stats"]["nodes"] > 1
+    assert stats["backtracks"] == stats["refreshes"] == stats["flood_fills"] == 0
+    assert stats["propagations"] == stats["propagation_steps"] == 0
+    assert stats["timings"] == {}
+
+
+def test_packed_board_tasks():
+    """Test solving a board packed for a worker process"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    data = tasks.pack_board(matrix)
+    assert len(data) == 25 * 4
+    assert tasks.unpack_board(data) == matrix
+    result = tasks.unpack_result(tasks.solve_board(data))
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert result == PuzzleSolver(state).solve()
+
+
+def test_tasks_free_value_limit():
+    """Test that worker solves take the free value limit of their process"""
+    data = tasks.pack_board([[0, 0, 0, 0], [0, 2, 0, 0], [3, 0, 0, 0], [0, 0, 0, 0]])
+    assert "solved_puzzle" not in tasks.solve_board(data)
+    tasks.init_worker(TRANSPOSITION_LIMIT, free_value_limit=0)
+    try:
+        solution = tasks.unpack_result(tasks.solve_board(data))["solved_puzzle"]
+        assert tasks.count_subtree(data, [], 2, None, None, None)["count"] >= 1
+    finally:
+        tasks.init_worker(TRANSPOSITION_LIMIT)
+    assert max(value for row in solution for value in row) > 9
+
+
+def test_solution_cache_symmetries():
+    """Test that rotated and mirrored boards share one cache entry"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    cache = SolutionCache(2)
+    assert cache.get(matrix) is None
+    cache.put(
+        matrix, PuzzleSolver(FieldState.from_list_to_state(matrix)["state"]).solve()
+    )
+    rotated = [list(row) for row in zip(*matrix[::-1])]
+    for board in (matrix, rotated, [row[::-1] for row in matrix], matrix[::-1]):
+        solution = cache.get(board)["solved_puzzle"]
+        assert all(
+            clue in (0, value)
+            for clues, row in zip(board, solution)
+            for clue, value in zip(clues, row)
+        )
+    assert solution == cache.get(matrix)["solved_puzzle"][::-1]
+    assert cache.stats() == {"hits": 5, "misses": 1, "size": 1}
+
+
+def test_solution_cache_eviction():
+    """Test size and TTL eviction, including cached unsolvable boards"""
+    cache = SolutionCache(2)
+    boards = [[[2, 0], [0, 1]], [[1, 0], [0, 3]], [[1, 2], [0, 0]]]
+    for board in boards:
+        cache.put(board, {"error": "Puzzle is unsolvable"})
+    assert cache.get(boards[0]) is None
+    assert cache.get([[0, 0], [2, 1]]) == {"error": "Puzzle is unsolvable"}
+    assert len(cache) == 2
+    cache = SolutionCache(2, ttl=0.01)
+    cache.put(boards[0], {"error": "Puzzle is unsolvable"})
+    time.sleep(0.02)
+    assert cache.get(boards[0]) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("size", (2, 5, 10, 30))
+def test_fill_grid(size):
+    """Test that grown grids follow the rules the solver enforces"""
+    grid = PuzzleGenerator(size).fill_grid()
+    cells = [value for row in grid for value in row]
+    regions = FieldState.from_list_to_state(grid)["state"].label_regions()
+    for index, value in enumerate(cells):
+        assert 1 <= value <= 9
+        assert regions.sizes[regions.labels[index]] == value
+        assert all(
+            abs(cells[neighbour] - value) != 1
+            for neighbour in neighbour_table(size)[index]
+        )
+
+
+def test_fill_grid_free_value_limit():
+    """Test that grids may grow regions past 9 cells under a higher limit"""
+    random.seed(7)
+    grids = [PuzzleGenerator(6, free_value_limit=36).fill_grid() for _ in range(20)]
+    values = [value for grid in grids for row in grid for value in row]
+    assert max(values) > 9
+    for grid in grids:
+        regions = FieldState.from_list_to_state(grid)["state"].label_regions()
+        assert all(size == value for size, value in zip(regions.sizes, regions.values))
+
+
+@pytest.mark.parametrize("size", (2, 5))
+def test_generate_puzzle_solvable(size):
+    """Test that generated puzzles can be solved"""
+    puzzle = PuzzleGenerator(size).generate_puzzle(0.5)
+    state = FieldState.from_list_to_state(puzzle)["state"]
+    assert "solved_puzzle" in PuzzleSolver(state).solve()
+
+
+@pytest.mark.parametrize(
+    "matrix, exclude, count",
+    (
+        ([[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]], {}, 2),
+        ([[0, 0], [0, 1]], {}, 1),
+        ([[2, 0], [0, 0]], {}, 0),
+        ([[1, 1], [0, 0]], {}, 0),
+        ([[3, 0, 0], [0, 0, 0], [0, 0, 1]], {}, 2),
+        ([[3, 0, 0], [0, 0, 0], [0, 0, 1]], {(1, 0): 3}, 1),
+        ([[3, 0, 0], [0, 0, 0], [0, 0, 1]], {(0, 0): 3}, 0),
+    ),
+)
+def test_count_solutions(matrix, exclude, count):
+    """Test counting solutions up to a limit"""
+    if len(matrix) == 4:
+        matrix.append([0, 0, 7, 0, 1])
+    state = FieldState.from_list_to_state(matrix)["state"]
+    solver = PuzzleSolver(state)
+    assert solver.count_solutions(limit=2, exclude=exclude) == count
+    assert len(solver.solutions) == count
+    assert state.to_list() == matrix
+
+
+def test_generate_unique_puzzle():
+    """Test that clues are only removed while the puzzle stays unique"""
+    puzzle = PuzzleGenerator(5).generate_puzzle(0.3, unique=True)
+    state = FieldState.from_list_to_state(puzzle)["state"]
+    assert PuzzleSolver(state).count_solutions(limit=2) == 1
+
+
+def test_remove_clues_shares_transpositions(monkeypatch):
+    """Test that the uniqueness checks of a puzzle share one table"""
+    tables = []
+
+    def solver(*args, **kwargs):
+        tables.append(kwargs["transpositions"])
+        return PuzzleSolver(*args, **kwargs)
+
+    monkeypatch.setattr("app.puzzle_solver.puzzle_generator.PuzzleSolver", solver)
+    random.seed(3)
+    puzzle = PuzzleGenerator(6).generate_puzzle(0.2, unique=True)
+    assert len(tables) > 1
+    assert all(table is tables[0] for table in tables)
+    state = FieldState.from_list_to_state(puzzle)["state"]
+    assert PuzzleSolver(state).count_solutions(limit=2) == 1
+
+
+def test_split_search_tree():
+    """Test that subtrees cover the search in the order it visits them"""
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    paths = PuzzleSolver(FieldState.from_list_to_state(matrix)["state"]).split(4)
+    assert len(paths) >= 4
+    solutions = []
+    counts = 0
+    for path in paths:
+        state = FieldState.from_list_to_state(matrix)["state"]
+        result = PuzzleSolver(state).solve(path=path)
+        solutions.extend([result["solved_puzzle"]] if "solved_puzzle" in result else [])
+        state = FieldState.from_list_to_state(matrix)["state"]
+        counts += PuzzleSolver(state).count_solutions(limit=10, path=path)
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert solutions[0] == PuzzleSolver(state).solve()["solved_puzzle"]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    assert counts == PuzzleSolver(state).count_solutions(limit=10)
+    state = FieldState.from_list_to_state([[2, 0], [0, 0]])["state"]
+    assert PuzzleSolver(state).split(4) == []
+    state = FieldState.from_list_to_state([[1, 1], [0, 0]])["state"]
+    with pytest.raises(ValueError, match="Wrong group size"):
+        PuzzleSolver(state).split(4)
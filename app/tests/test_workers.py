@@ -0,0 +1,215 @@
+"""Test the worker pools"""
+
+import asyncio
+import pstats
+
+from app.metrics import solve_seconds
+from app.puzzle_solver import FieldState, PuzzleSolver
+from app.workers import JobQueueFull, PuzzlePool, SolveJob, SolveJobQueue, SolverPool
+
+
+async def wait_for_depth(pool: PuzzlePool, depth: int) -> None:
+    """Wait until the first bucket of a pool is stocked to a depth"""
+    for _ in range(200):
+        if pool.stats()["buckets"][0]["depth"] == depth:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(pool.stats())
+
+
+async def test_puzzle_pool_watermarks():
+    """Test refilling buckets between the watermarks and falling back"""
+    pool = PuzzlePool(
+        SolverPool(0),
+        low_watermark=2,
+        high_watermark=3,
+        buckets=[(4, 0.5, False)],
+        max_buckets=2,
+    )
+    pool.start()
+    try:
+        await wait_for_depth(pool, 3)
+        assert len(await pool.get(4, 0.5)) == 4
+        await asyncio.sleep(0.05)
+        assert pool.stats()["buckets"][0]["depth"] == 2
+        assert len(await pool.get(4, 0.5)) == 4
+        await wait_for_depth(pool, 3)
+
+        assert len(await pool.get(5, 0.5)) == 5
+        assert len(await pool.get(6, 0.5)) == 6
+        stats = pool.stats()
+        assert stats["unbucketed_fallbacks"] == 1
+        first, second = stats["buckets"]
+        assert (first["hits"], first["fallbacks"], first["generated"]) == (2, 0, 5)
+        assert first["refill_rate"] > 0
+        assert (second["size"], second["fallbacks"]) == (5, 1)
+    finally:
+        await pool.stop()
+
+
+async def test_solve_job_queue():
+    """Test saturation, cancellation and expiry of solve jobs"""
+    queue = SolveJobQueue(SolverPool(0), max_running=1, max_queued=1, ttl=0.05)
+
+    async def wait_for_cancel(job: SolveJob) -> None:
+        while not job.cancel.is_set():
+            await asyncio.sleep(0.01)
+        job.result = {"budget_exceeded": "cancelled"}
+
+    async def solve(job: SolveJob) -> None:
+        job.result = {"solved_puzzle": job.rows}
+
+    first = await queue.submit(1, [[1]], wait_for_cancel)
+    second = await queue.submit(1, [[1]], solve)
+    try:
+        await queue.submit(1, [[1]], solve)
+        raise AssertionError("queue should be full")
+    except JobQueueFull:
+        pass
+    await asyncio.sleep(0.02)
+    assert (first.status, second.status) == ("running", "queued")
+    assert queue.get(first.id, 2) is None
+    assert await queue.cancel(first.id, 2) is None
+    assert (await queue.cancel(first.id, 1)).status == "cancelled"
+    await asyncio.wait_for(second.task, 1)
+    assert second.status == "done"
+    assert queue.get(second.id, 1).result == {"solved_puzzle": [[1]]}
+    await asyncio.sleep(0.06)
+    assert queue.get(second.id, 1) is None
+    assert not queue.jobs
+    await queue.stop()
+
+
+async def test_pool_events_off_loop():
+    """Test that state shared with the workers is made and read off the loop"""
+    pool = SolverPool(1)
+    pool.start()
+    ticks = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    ticker = asyncio.ensure_future(tick())
+    try:
+        event = await pool.cancel_event()
+        await pool.set_event(event)
+        assert event.is_set()
+        progress = await pool.progress_queue()
+        progress.put({"nodes": 1})
+        progress.put({"nodes": 2})
+        assert await pool.progress_reports(progress) == [{"nodes": 1}, {"nodes": 2}]
+        assert await pool.progress_reports(progress) == []
+    finally:
+        ticker.cancel()
+        pool.shutdown()
+    assert ticks > 1
+
+
+async def test_profile_in_worker_process(tmp_path):
+    """Test that a solve is profiled inside the worker process"""
+    pool = SolverPool(1)
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    try:
+        result = await pool.solve(
+            FieldState.from_list_to_state(matrix)["state"], profile=True
+        )
+    finally:
+        pool.shutdown()
+    assert result["solved_puzzle"][0] == [1, 5, 2, 2, 4]
+    assert "_try_fill_empty_cells" in result["profile"]["stats"]
+    path = tmp_path / "profile.pstats"
+    path.write_bytes(result["profile"]["pstats"])
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+async def test_parallel_solve():
+    """Test that a parallel solve finds the sequential first solution"""
+    pool = SolverPool(2)
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    try:
+        result = await pool.solve_parallel(
+            FieldState.from_list_to_state(matrix)["state"]
+        )
+        count = await pool.count_parallel(
+            FieldState.from_list_to_state(matrix)["state"], limit=2
+        )
+        unsolvable = await pool.solve_parallel(
+            FieldState.from_list_to_state([[2, 0], [0, 0]])["state"]
+        )
+        invalid = FieldState.from_list_to_state([[1, 1], [0, 0]])["state"]
+        wrong_size = await pool.solve_parallel(invalid)
+        invalid_count = await pool.count_parallel(invalid)
+        # The budget is the one of the whole solve, which takes 49 nodes.
+        budget = await pool.solve_parallel(
+            FieldState.from_list_to_state(matrix)["state"], max_nodes=20
+        )
+        board = [[0] * 15 for _ in range(15)]
+        board[0][:2] = [1, 1]
+        large = await pool.solve(FieldState.from_list_to_state(board)["state"])
+    finally:
+        pool.shutdown()
+    assert result["solved_puzzle"] == [
+        [1, 5, 2, 2, 4],
+        [5, 5, 5, 7, 4],
+        [1, 3, 5, 7, 4],
+        [3, 3, 1, 7, 4],
+        [7, 7, 7, 7, 1],
+    ]
+    assert result["stats"]["subtrees"] >= 8
+    assert count == 2
+    assert unsolvable["error"] == "Puzzle is unsolvable"
+    assert wrong_size["error"] == "Wrong group size"
+    assert invalid_count == 0
+    assert budget["budget_exceeded"] == "max_nodes"
+    assert large == {"error": "Wrong group size"}
+
+
+async def test_pool_without_counters():
+    """Test that the workers of a pool without counters keep none
+
+    The solve time is still recorded.
+    """
+    pool = SolverPool(1, counters=False)
+    matrix = [[1, 0, 2, 0, 0], [0, 5, 0, 0, 0], [1, 0, 0, 0, 4], [0, 0, 1, 0, 0]]
+    matrix.append([0, 0, 7, 0, 1])
+    key = ("5", "solved")
+    solves = sum(solve_seconds.samples[key][0]) if key in solve_seconds.samples else 0
+    try:
+        result = await pool.solve(
+            FieldState.from_list_to_state(matrix)["state"], stats=True
+        )
+    finally:
+        pool.shutdown()
+    assert result["stats"]["nodes"] > 1
+    assert result["stats"]["backtracks"] == 0
+    assert result["stats"]["timings"] == {}
+    assert sum(solve_seconds.samples[key][0]) == solves + 1
+
+
+async def test_parallel_components():
+    """Test that solving the components apart finds the sequential solution"""
+    pool = SolverPool(2)
+    matrix = [
+        [0, 6, 6, 3, 3, 0, 0],
+        [0, 6, 0, 3, 8, 0, 0],
+        [4, 0, 4, 0, 0, 0, 8],
+        [2, 4, 6, 6, 6, 6, 6],
+        [2, 0, 0, 0, 6, 0, 4],
+        [8, 0, 8, 0, 8, 4, 4],
+        [0, 6, 6, 0, 6, 0, 1],
+    ]
+    state = FieldState.from_list_to_state(matrix)["state"]
+    components = PuzzleSolver(state.copy()).components()
+    try:
+        result = await pool.solve_components(state, components)
+    finally:
+        pool.shutdown()
+    assert len(components) == 3
+    assert result["stats"]["components"] == 3
+    expected = PuzzleSolver(state, decompose=True).solve()
+    assert result["solved_puzzle"] == expected["solved_puzzle"]
@@ -0,0 +1,17 @@
+"""Import module"""
+
+__all__ = (
+    "JobQueueFull",
+    "PuzzlePool",
+    "SolveJob",
+    "SolveJobQueue",
+    "SolverPool",
+    "puzzle_pool",
+    "solve_jobs",
+    "solver_pool",
+)
+
+
+from app.workers.jobs import JobQueueFull, SolveJob, SolveJobQueue, solve_jobs
+from app.workers.pool import SolverPool, solver_pool
+from app.workers.puzzles import PuzzlePool, puzzle_pool
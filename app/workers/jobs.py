@@ -0,0 +1,163 @@
+"""Background solve jobs with bounded concurrency and result retention."""
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import solver_settings
+from app.workers.pool import SolverPool, solver_pool
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is saturated."""
+
+
+class SolveJob:
+    """A board submitted for solving in the background."""
+
+    def __init__(self, user_id: int, rows: List[List[int]], cancel: Any):
+        """Initialize a queued job."""
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.rows = rows
+        self.cancel = cancel
+        self.status = JOB_QUEUED
+        self.result: Dict[str, Any] = {}
+        self.matrix: Any = None
+        self.created = time.monotonic()
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> bool:
+        """Whether the job is queued or running."""
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+
+class SolveJobQueue:
+    """Runs solve jobs in the background and keeps their results for a while.
+
+    At most ``max_running`` jobs run at once and at most ``max_queued`` more
+    wait for a slot; beyond that ``submit`` raises ``JobQueueFull``. Finished
+    jobs are dropped ``ttl`` seconds after they finish.
+    """
+
+    def __init__(
+        self, workers: SolverPool, max_running: int, max_queued: int, ttl: float
+    ):
+        """Initialize an empty queue."""
+        self.workers = workers
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.jobs: Dict[str, SolveJob] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def submit(
+        self,
+        user_id: int,
+        rows: List[List[int]],
+        run: Callable[[SolveJob], Awaitable[None]],
+    ) -> SolveJob:
+        """Queue a job; ``run`` solves it and fills its result."""
+        # Taken before the check, so no other submit runs between the check
+        # and the job joining the queue.
+        cancel = await self.workers.cancel_event()
+        self._purge()
+        if sum(job.active for job in self.jobs.values()) >= (
+            self.max_running + self.max_queued
+        ):
+            raise JobQueueFull()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        job = SolveJob(user_id, rows, cancel)
+        job.task = asyncio.create_task(self._run(job, run, self._slots))
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[SolveJob]:
+        """Get a job of a user."""
+        self._purge()
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def cancel(self, job_id: str, user_id: int) -> Optional[SolveJob]:
+        """Cancel a job of a user if it has not finished yet."""
+        job = self.get(job_id, user_id)
+        if job is not None and job.active:
+            if job.task is not None:
+                job.task.cancel()
+            self._finish(job, JOB_CANCELLED)
+            await self.workers.set_event(job.cancel)
+        return job
+
+    async def stop(self) -> None:
+        """Cancel every unfinished job."""
+        for job in list(self.jobs.values()):
+            await self.cancel(job.id, job.user_id)
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(
+        self,
+        job: SolveJob,
+        run: Callable[[SolveJob], Awaitable[None]],
+        slots: asyncio.Semaphore,
+    ) -> None:
+        """Run a job once a slot is free and record how it ended."""
+        async with slots:
+            job.status = JOB_RUNNING
+            try:
+                await run(job)
+            except asyncio.CancelledError:
+                self._finish(job, JOB_CANCELLED)
+                raise
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Solve job %s failed", job.id)
+                job.result = {"error": "Internal Server Error"}
+                self._finish(job, JOB_FAILED)
+                return
+        if job.result.get("budget_exceeded") == "cancelled":
+            self._finish(job, JOB_CANCELLED)
+        elif job.result.get("solved_puzzle"):
+            self._finish(job, JOB_DONE)
+        else:
+            self._finish(job, JOB_FAILED)
+
+    @staticmethod
+    def _finish(job: SolveJob, status: str) -> None:
+        """Mark a job finished, keeping the first final status."""
+        if job.finished is None:
+            job.status = status
+            job.finished = time.monotonic()
+
+    def _purge(self) -> None:
+        """Drop finished jobs older than the TTL."""
+        expired = time.monotonic() - self.ttl
+        for job_id in [
+            job.id
+            for job in self.jobs.values()
+            if job.finished is not None and job.finished < expired
+        ]:
+            del self.jobs[job_id]
+
+
+solve_jobs = SolveJobQueue(
+    solver_pool,
+    max_running=solver_settings.SOLVE_JOB_WORKERS,
+    max_queued=solver_settings.SOLVE_JOB_QUEUE_LIMIT,
+    ttl=solver_settings.SOLVE_JOB_TTL,
+)
@@ -0,0 +1,500 @@
+"""Process pool for CPU-bound puzzle work."""
+
+# pylint: disable=too-many-arguments,too-many-locals
+import asyncio
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import metrics_settings, profiling_settings, solver_settings
+from app.metrics import solve_seconds
+from app.puzzle_solver import FieldState, SolveBudgetExceeded, profiling, tasks
+from app.puzzle_solver.cache import SolutionCache
+from app.puzzle_solver.solver import FREE_VALUE_LIMIT, TRANSPOSITION_LIMIT
+
+
+class SolverPool:
+    """Runs solver and generator calls in worker processes."""
+
+    def __init__(
+        self,
+        max_workers: int,
+        cache: Optional[SolutionCache] = None,
+        transposition_limit: int = TRANSPOSITION_LIMIT,
+        decompose: bool = False,
+        counters: bool = True,
+        free_value_limit: int = FREE_VALUE_LIMIT,
+    ):
+        """Initialize the pool; ``max_workers`` of 0 runs work inline.
+
+        Every worker process keeps a table of ``transposition_limit`` dead
+        boards across its solves. With ``decompose`` the independent
+        components of a board are solved apart, in parallel for large boards.
+        Without ``counters`` the solvers keep no statistics besides their
+        nodes, and solves are left out of the solve time metrics.
+        ``free_value_limit`` is the one of ``PuzzleSolver`` for every solve and
+        generated puzzle; 0 lets regions without a clue take the whole board.
+        """
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else SolutionCache(0)
+        self.decompose = decompose
+        self.counters = counters
+        # Arguments of ``tasks.init_worker`` for every worker process.
+        self._worker_options = (transposition_limit, counters, free_value_limit)
+        if max_workers <= 0:
+            tasks.init_worker(*self._worker_options)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager: Optional[SyncManager] = None
+
+    def start(self) -> None:
+        """Start the worker processes and the manager of their shared state.
+
+        Called at startup, so requests do not wait for the processes to
+        start; work started before starts them on first use.
+        """
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=tasks.init_worker,
+                initargs=self._worker_options,
+            )
+            self._get_manager()
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, dropping queued work."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    async def cancel_event(self) -> Any:
+        """Return an event that cancels a solve running in a worker process.
+
+        Events for worker processes live in the manager process and are
+        created from a thread, since that is a call to the manager; inline
+        solves get a plain thread event.
+        """
+        if self.max_workers <= 0:
+            return threading.Event()
+        return await asyncio.to_thread(lambda: self._get_manager().Event())
+
+    async def set_event(self, event: Any) -> None:
+        """Set an event from ``cancel_event`` without blocking the loop."""
+        if self.max_workers <= 0:
+            event.set()
+        else:
+            await asyncio.to_thread(event.set)
+
+    async def progress_queue(self) -> Any:
+        """Return a queue that receives the progress reports of a solve.
+
+        Queues for worker processes are made like ``cancel_event`` events.
+        """
+        if self.max_workers <= 0:
+            return queue.SimpleQueue()
+        return await asyncio.to_thread(lambda: self._get_manager().Queue())
+
+    async def progress_reports(self, progress: Any) -> List[Dict[str, Any]]:
+        """Take the reports queued so far on a queue from ``progress_queue``.
+
+        Reading a manager queue is a call per report, so it runs in a thread.
+        """
+        if self.max_workers <= 0:
+            return _drain(progress)
+        return await asyncio.to_thread(_drain, progress)
+
+    def _shared_value(self, value: int) -> Any:
+        """Return an integer shared with the worker processes."""
+        if self.max_workers <= 0:
+            return SimpleNamespace(value=value)
+        return self._get_manager().Value("i", value)
+
+    def _get_manager(self) -> SyncManager:
+        """Start the manager process on first use."""
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a picklable function in the pool without blocking the loop."""
+        if self.max_workers <= 0:
+            return func(*args)
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def profile(
+        self, func: Callable[..., Any], *args: Any
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Run a picklable function in the pool under the profiler.
+
+        Returns the result and the profile report taken in the worker.
+        """
+        return await self.run(
+            profiling.profile_call,
+            func,
+            profiling_settings.PROFILE_SAMPLE_INTERVAL,
+            *args,
+        )
+
+    async def solve(
+        self,
+        state: FieldState,
+        timeout: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+        cancel: Any = None,
+        progress: Any = None,
+        stats: bool = False,
+        profile: bool = False,
+        lookup: bool = True,
+    ) -> Dict[str, Any]:
+        """Solve a board in a worker process, answering repeats from the cache.
+
+        Results cut short by the budget are not cached. ``cancel`` is an
+        event from ``cancel_event`` and ``progress`` a queue from
+        ``progress_queue``. The solver statistics feed the solve time
+        metrics and are only kept in the result with ``stats``. With
+        ``profile`` the cache is bypassed and the result carries the profile
+        report under ``profile``. Without ``lookup`` the cache is only
+        written, for callers that already looked the board up.
+
+        Large boards are searched in all the workers: their components each
+        in a worker when they split, else their subtrees.
+        """
+        board = state.to_list()
+        if lookup and not profile and (result := self.cache.get(board)) is not None:
+            return result
+        started = time.perf_counter()
+        if (
+            self.max_workers > 1
+            and len(board) >= solver_settings.SOLVE_PARALLEL_MIN_SIZE
+            and progress is None
+            and not profile
+        ):
+            try:
+                components = (
+                    await self.run(tasks.decompose_board, state.to_bytes())
+                    if self.decompose
+                    else []
+                )
+            except ValueError:
+                # The subtree search reports the broken rule.
+                components = []
+            if len(components) > 1:
+                result = await self.solve_components(
+                    state, components, timeout, max_nodes, cancel
+                )
+            else:
+                result = await self.solve_parallel(
+                    state,
+                    timeout,
+                    max_nodes,
+                    cancel,
+                    deterministic=solver_settings.SOLVE_PARALLEL_DETERMINISTIC,
+                )
+            return self._finish_solve(board, result, stats, started)
+        args = (
+            tasks.solve_board,
+            state.to_bytes(),
+            timeout,
+            max_nodes,
+            cancel,
+            progress,
+            solver_settings.SOLVE_PROGRESS_INTERVAL,
+            True,
+            (),
+            None,
+            self.decompose,
+        )
+        report = None
+        if profile:
+            result, report = await self.profile(*args)
+        else:
+            result = await self.run(*args)
+        result = self._finish_solve(board, tasks.unpack_result(result), stats, started)
+        if report is not None:
+            result["profile"] = report
+        return result
+
+    async def solve_parallel(
+        self,
+        state: FieldState,
+        timeout: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+        cancel: Any = None,
+        deterministic: bool = True,
+    ) -> Dict[str, Any]:
+        """Search the subtrees of a board in all the worker processes.
+
+        The tree is split at a shallow depth into more subtrees than there
+        are workers, so a worker that finishes early takes the next one. The
+        first solution found cancels the other subtrees. In deterministic
+        mode only later subtrees are cancelled and the earlier ones run to
+        the end, so within the budget the result is the one of a sequential
+        solve, errors on boards breaking the rules included. ``max_nodes`` is
+        split evenly across the subtrees, so together they search no more
+        nodes than a sequential solve may. The result carries the summed
+        statistics.
+        """
+        data = state.to_bytes()
+        started = time.perf_counter()
+        failure: Dict[str, Any] = {"error": "Puzzle is unsolvable"}
+        try:
+            paths = await self.run(
+                tasks.split_board,
+                data,
+                max(self.max_workers, 1) * solver_settings.SOLVE_PARALLEL_SPLIT,
+            )
+        except ValueError as excp:
+            paths, failure = [], {"error": str(excp)}
+        split = time.perf_counter() - started
+        deadline = None if timeout is None else time.time() + timeout
+        results = await self._search_subtrees(
+            tasks.solve_subtree,
+            data,
+            paths,
+            lambda result: "solved_puzzle" in result,
+            (deadline, _split_budget(max_nodes, len(paths))),
+            cancel,
+            stop_later_only=deterministic,
+        )
+        ordered = [results[index] for index in sorted(results)]
+        answer = next(
+            (result for result in ordered if "solved_puzzle" in result),
+            next(
+                (result for result in ordered if "budget_exceeded" in result),
+                failure,
+            ),
+        )
+        answer = dict(tasks.unpack_result(answer))
+        answer["stats"] = {
+            "nodes": sum(result["stats"]["nodes"] for result in results.values()),
+            "subtrees": len(paths),
+            "timings": {
+                "split": split,
+                "search": time.perf_counter() - started - split,
+            },
+        }
+        return answer
+
+    async def solve_components(
+        self,
+        state: FieldState,
+        components: List[List[int]],
+        timeout: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+        cancel: Any = None,
+    ) -> Dict[str, Any]:
+        """Solve the components of a board in all the worker processes.
+
+        ``components`` are the ones of ``PuzzleSolver.components``. The
+        solutions of the components are merged into the one of the board,
+        which is the one of a sequential solve with ``decompose``. A
+        component without a solution, or out of its budget, cancels the
+        others and decides the result. ``max_nodes`` is split evenly across
+        the components. The result carries the summed statistics.
+        """
+        data = state.to_bytes()
+        started = time.perf_counter()
+        deadline = None if timeout is None else time.time() + timeout
+        results = await self._search_subtrees(
+            tasks.solve_component,
+            data,
+            components,
+            lambda result: "solved_puzzle" not in result,
+            (deadline, _split_budget(max_nodes, len(components))),
+            cancel,
+            stop_later_only=False,
+        )
+        ordered = [results[index] for index in sorted(results)]
+        failed = [result for result in ordered if "solved_puzzle" not in result]
+        answer = next(
+            (result for result in failed if "budget_exceeded" not in result),
+            failed[0] if failed else None,
+        )
+        if answer is not None:
+            answer = dict(tasks.unpack_result(answer))
+        else:
+            # Every result holds the cells filled by the initial propagation,
+            # which lie in no component; the first one is taken as a whole.
+            solved = FieldState.from_bytes(ordered[0]["solved_puzzle"])
+            for component, result in zip(components[1:], ordered[1:]):
+                cells = FieldState.from_bytes(result["solved_puzzle"]).cells
+                for index in component:
+                    solved.set_index(index, cells[index])
+            answer = {"solved_puzzle": solved.to_list()}
+        answer["stats"] = {
+            "nodes": sum(result["stats"]["nodes"] for result in results.values()),
+            "components": len(components),
+            "timings": {"search": time.perf_counter() - started},
+        }
+        return answer
+
+    async def count_parallel(
+        self,
+        state: FieldState,
+        limit: int = 2,
+        timeout: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+        cancel: Any = None,
+    ) -> int:
+        """Count the solutions of a board up to ``limit`` in all the workers.
+
+        Subtrees are counted as in ``solve_parallel`` and the rest are
+        cancelled once ``limit`` solutions are found. A subtree running out
+        of its share of ``max_nodes`` first raises ``SolveBudgetExceeded``. A board breaking
+        the rules has no solutions, as in ``count_solutions``.
+        """
+        data = state.to_bytes()
+        try:
+            paths = await self.run(
+                tasks.split_board,
+                data,
+                max(self.max_workers, 1) * solver_settings.SOLVE_PARALLEL_SPLIT,
+            )
+        except ValueError:
+            return 0
+        deadline = None if timeout is None else time.time() + timeout
+        found = 0
+
+        def reached(result: Dict[str, Any]) -> bool:
+            nonlocal found
+            if "budget_exceeded" in result:
+                raise SolveBudgetExceeded(result["budget_exceeded"])
+            found += result["count"]
+            return found >= limit
+
+        await self._search_subtrees(
+            tasks.count_subtree,
+            data,
+            paths,
+            reached,
+            (limit, deadline, _split_budget(max_nodes, len(paths))),
+            cancel,
+            stop_later_only=False,
+        )
+        return min(found, limit)
+
+    async def _search_subtrees(
+        self,
+        func: Callable[..., Dict[str, Any]],
+        data: bytes,
+        paths: Sequence[Sequence[Any]],
+        done: Callable[[Dict[str, Any]], bool],
+        args: Tuple[Any, ...],
+        cancel: Any,
+        stop_later_only: bool,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Run a subtree task per path until ``done`` accepts a result.
+
+        Subtrees after an accepted one are cancelled, and with
+        ``stop_later_only`` the earlier ones still run to completion;
+        otherwise every other subtree is cancelled. Returns the results by
+        subtree index.
+        """
+        cutoff = self._shared_value(len(paths))
+        futures = {
+            asyncio.ensure_future(
+                self.run(
+                    func,
+                    data,
+                    path,
+                    *args,
+                    tasks.SubtreeCancel(cutoff, index, cancel),
+                )
+            ): index
+            for index, path in enumerate(paths)
+        }
+        results: Dict[int, Dict[str, Any]] = {}
+        best = len(paths)
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in finished:
+                    index = futures[future]
+                    results[index] = future.result()
+                    if index < best and done(results[index]):
+                        best = index
+                if best < len(paths):
+                    cutoff.value = best if stop_later_only else -1
+                    pending = {
+                        future
+                        for future in pending
+                        if stop_later_only and futures[future] < best
+                    }
+        finally:
+            cutoff.value = -1
+            for future in futures:
+                future.cancel()
+        return results
+
+    def _finish_solve(
+        self,
+        board: List[List[int]],
+        result: Dict[str, Any],
+        stats: bool,
+        started: float,
+    ) -> Dict[str, Any]:
+        """Record the metrics of a solve, cache it and drop unasked statistics.
+
+        The solve time runs from ``started`` rather than summing the solver
+        timings, so it is recorded with the counters off too.
+        """
+        if not stats:
+            del result["stats"]
+        solve_seconds.observe(
+            time.perf_counter() - started,
+            len(board),
+            result.get("budget_exceeded")
+            or ("solved" if "solved_puzzle" in result else "unsolvable"),
+        )
+        if not result.get("budget_exceeded"):
+            self.cache.put(
+                board, {key: value for key, value in result.items() if key != "stats"}
+            )
+        return result
+
+    async def generate(
+        self, size: int, filled_percentage: float, unique: bool = False
+    ) -> List[List[int]]:
+        """Generate a puzzle in a worker process."""
+        board = await self.run(tasks.generate_board, size, filled_percentage, unique)
+        return tasks.unpack_board(board)
+
+
+def _split_budget(max_nodes: Optional[int], count: int) -> Optional[int]:
+    """Return the node budget of each of ``count`` searches sharing one."""
+    if max_nodes is None:
+        return None
+    return max(max_nodes // max(count, 1), 1)
+
+
+def _drain(progress: Any) -> List[Dict[str, Any]]:
+    """Take every report waiting on a progress queue."""
+    reports = []
+    while not progress.empty():
+        reports.append(progress.get_nowait())
+    return reports
+
+
+solver_pool = SolverPool(
+    solver_settings.SOLVER_WORKERS,
+    cache=SolutionCache(
+        solver_settings.SOLVE_CACHE_SIZE, ttl=solver_settings.SOLVE_CACHE_TTL
+    ),
+    transposition_limit=solver_settings.SOLVE_TRANSPOSITION_SIZE,
+    decompose=solver_settings.SOLVE_DECOMPOSE,
+    counters=metrics_settings.SOLVER_COUNTERS_ENABLED,
+    free_value_limit=solver_settings.SOLVE_FREE_VALUE_LIMIT,
+)
@@ -0,0 +1,177 @@
+"""Stock of pre-generated puzzles for instant generation requests."""
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+# pylint: disable=too-many-arguments
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.config import solver_settings
+from app.workers.pool import SolverPool, solver_pool
+
+logger = logging.getLogger(__name__)
+
+BucketKey = Tuple[int, float, bool]
+
+
+class PuzzleBucket:
+    """Ready puzzles of one size, clue percentage and uniqueness."""
+
+    def __init__(self, key: BucketKey):
+        """Initialize an empty bucket."""
+        self.key = key
+        self.puzzles: Deque[List[List[int]]] = deque()
+        self.hits = 0
+        self.fallbacks = 0
+        self.generated = 0
+        self.generate_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the depth and counters of the bucket."""
+        size, filled_percentage, unique = self.key
+        return {
+            "size": size,
+            "filled_percentage": filled_percentage,
+            "unique": unique,
+            "depth": len(self.puzzles),
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "generated": self.generated,
+            "refill_rate": (
+                self.generated / self.generate_seconds if self.generate_seconds else 0.0
+            ),
+        }
+
+
+class PuzzlePool:
+    """Keeps buckets of generated puzzles stocked from the worker processes.
+
+    A bucket below ``low_watermark`` is refilled up to ``high_watermark`` by a
+    background producer. Buckets are configured up front or added on the first
+    request for them, up to ``max_buckets``.
+    """
+
+    def __init__(
+        self,
+        workers: SolverPool,
+        low_watermark: int,
+        high_watermark: int,
+        buckets: Iterable[BucketKey] = (),
+        max_buckets: int = 32,
+        concurrency: int = 1,
+    ):
+        """Initialize the pool; a ``high_watermark`` of 0 disables stocking."""
+        self.workers = workers
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.max_buckets = max_buckets
+        self.concurrency = concurrency
+        self.buckets: Dict[BucketKey, PuzzleBucket] = {}
+        for key in buckets:
+            self._bucket(key)
+        self.unbucketed_fallbacks = 0
+        self._refill: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background producer on the running loop."""
+        if self._task is None and self.high_watermark > 0:
+            self._refill = asyncio.Event()
+            self._refill.set()
+            self._task = asyncio.create_task(self._produce(self._refill))
+
+    async def stop(self) -> None:
+        """Stop the background producer."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._refill = None
+
+    async def get(
+        self, size: int, filled_percentage: float, unique: bool = False
+    ) -> List[List[int]]:
+        """Take a stocked puzzle, generating one inline if the bucket is empty."""
+        bucket = self._bucket((size, filled_percentage, unique))
+        if bucket is not None and bucket.puzzles:
+            bucket.hits += 1
+            puzzle = bucket.puzzles.popleft()
+            if len(bucket.puzzles) < self.low_watermark:
+                self._wake()
+            return puzzle
+        if bucket is not None:
+            bucket.fallbacks += 1
+            self._wake()
+        else:
+            self.unbucketed_fallbacks += 1
+        return await self.workers.generate(size, filled_percentage, unique)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the depth and counters of every bucket."""
+        return {
+            "buckets": [bucket.stats() for bucket in self.buckets.values()],
+            "unbucketed_fallbacks": self.unbucketed_fallbacks,
+        }
+
+    def _wake(self) -> None:
+        """Wake the producer up if it is running."""
+        if self._refill is not None:
+            self._refill.set()
+
+    def _bucket(self, key: BucketKey) -> Optional[PuzzleBucket]:
+        """Get the bucket of a key, adding it while there is room."""
+        bucket = self.buckets.get(key)
+        if bucket is None and self.high_watermark > 0:
+            if len(self.buckets) < self.max_buckets:
+                bucket = self.buckets[key] = PuzzleBucket(key)
+        return bucket
+
+    async def _produce(self, refill: asyncio.Event) -> None:
+        """Refill the buckets below the low watermark whenever woken up."""
+        while True:
+            await refill.wait()
+            refill.clear()
+            for bucket in list(self.buckets.values()):
+                if len(bucket.puzzles) < self.low_watermark:
+                    await self._fill(bucket)
+
+    async def _fill(self, bucket: PuzzleBucket) -> None:
+        """Generate puzzles for a bucket up to the high watermark."""
+        while len(bucket.puzzles) < self.high_watermark:
+            count = min(self.concurrency, self.high_watermark - len(bucket.puzzles))
+            started = time.monotonic()
+            results = await asyncio.gather(
+                *(self.workers.generate(*bucket.key) for _ in range(count)),
+                return_exceptions=True,
+            )
+            bucket.generate_seconds += time.monotonic() - started
+            for result in results:
+                if isinstance(result, BaseException):
+                    logger.error("Puzzle generation failed: %r", result)
+                    return
+                bucket.puzzles.append(result)
+                bucket.generated += 1
+
+
+def parse_buckets(value: str) -> List[BucketKey]:
+    """Parse buckets written as ``size:filled_percentage[:unique]``."""
+    buckets = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        size, filled_percentage, *unique = item.split(":")
+        buckets.append((int(size), float(filled_percentage), unique == ["unique"]))
+    return buckets
+
+
+puzzle_pool = PuzzlePool(
+    solver_pool,
+    low_watermark=solver_settings.PUZZLE_POOL_LOW_WATERMARK,
+    high_watermark=solver_settings.PUZZLE_POOL_HIGH_WATERMARK,
+    buckets=parse_buckets(solver_settings.PUZZLE_POOL_BUCKETS),
+    max_buckets=solver_settings.PUZZLE_POOL_MAX_BUCKETS,
+    concurrency=solver_settings.PUZZLE_POOL_CONCURRENCY,
+)
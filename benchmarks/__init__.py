@@ -0,0 +1 @@
+"""Solver benchmarks: a versioned puzzle corpus and a regression runner."""
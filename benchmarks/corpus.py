@@ -0,0 +1,124 @@
+"""Versioned corpus of benchmark puzzles.
+
+The corpus is generated once from a fixed seed and stored as JSON, so it
+stays the same when the generator changes. A new corpus gets a new version
+instead of replacing a stored one.
+
+    python -m benchmarks.corpus --version 2
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+from app.puzzle_solver import FieldState, PuzzleGenerator, PuzzleSolver
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+CORPUS_VERSION = 2
+
+SIZES = (5, 8, 10, 12, 15, 20, 30)
+DENSITIES = (0.4, 0.55, 0.7)
+
+# Search nodes used to confirm that a candidate unsolvable case really is.
+UNSOLVABLE_MAX_NODES = 50000
+
+
+def corpus_path(version: int = CORPUS_VERSION) -> str:
+    """Return the path of a corpus version."""
+    return os.path.join(CORPUS_DIR, f"v{version}.json")
+
+
+def load_corpus(version: int = CORPUS_VERSION) -> Dict[str, Any]:
+    """Load a stored corpus version."""
+    with open(corpus_path(version), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _case(
+    name: str, kind: str, rows: List[List[int]], expected: Optional[str]
+) -> Dict[str, Any]:
+    """Build a corpus case; ``expected`` is None when the outcome is unknown."""
+    return {
+        "name": name,
+        "kind": kind,
+        "size": len(rows),
+        "clues": sum(bool(value) for row in rows for value in row),
+        "expected": expected,
+        "rows": rows,
+    }
+
+
+def _unsolvable(puzzle: List[List[int]], attempts: int = 200) -> List[List[int]]:
+    """Change one clue of a puzzle until it is unsolvable past propagation."""
+    clues = [
+        (x, y) for x, row in enumerate(puzzle) for y, value in enumerate(row) if value
+    ]
+    for _ in range(attempts):
+        x, y = random.choice(clues)
+        rows = [row[:] for row in puzzle]
+        rows[x][y] = random.choice(
+            [value for value in range(1, 10) if value != puzzle[x][y]]
+        )
+        solver = PuzzleSolver(FieldState.from_list_to_state(rows)["state"])
+        result = solver.solve(max_nodes=UNSOLVABLE_MAX_NODES)
+        if result.get("error") == "Puzzle is unsolvable" and solver.nodes > 1:
+            return rows
+    raise RuntimeError("No unsolvable variant found")
+
+
+def build_corpus(seed: int, version: int = CORPUS_VERSION) -> Dict[str, Any]:
+    """Generate the cases of a corpus version from a seed."""
+    random.seed(seed)
+    cases = [
+        _case(
+            "reference-5",
+            "reference",
+            [
+                [1, 0, 2, 0, 0],
+                [0, 5, 0, 0, 0],
+                [1, 0, 0, 0, 4],
+                [0, 0, 1, 0, 0],
+                [0, 0, 7, 0, 1],
+            ],
+            "solved",
+        )
+    ]
+    for size in SIZES:
+        for density in DENSITIES:
+            puzzle = PuzzleGenerator(size).generate_puzzle(density)
+            cases.append(_case(f"random-{size}-{density}", "random", puzzle, "solved"))
+    for size in (8, 10):
+        puzzle = PuzzleGenerator(size).generate_puzzle(0.0, unique=True)
+        cases.append(_case(f"unique-{size}", "unique", puzzle, "solved"))
+    for size in (10, 12):
+        puzzle = PuzzleGenerator(size).generate_puzzle(0.3)
+        cases.append(_case(f"sparse-{size}", "hard", puzzle, "solved"))
+    for size in (6, 8):
+        puzzle = _unsolvable(PuzzleGenerator(size).generate_puzzle(0.4))
+        cases.append(_case(f"unsolvable-{size}", "unsolvable", puzzle, "unsolvable"))
+    return {"version": version, "seed": seed, "cases": cases}
+
+
+def main() -> None:
+    """Generate and store a corpus version."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--version", type=int, default=CORPUS_VERSION)
+    parser.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+    path = corpus_path(args.version)
+    if os.path.exists(path):
+        parser.error(f"{path} exists; a new corpus needs a new --version")
+    corpus = build_corpus(args.seed, args.version)
+    text = json.dumps(corpus, indent=1)
+    # One board row per line keeps the corpus readable in diffs.
+    text = re.sub(r"\[[\d,\s]*\]", lambda match: json.dumps(json.loads(match[0])), text)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text + "\n")
+    print(f"Wrote {len(corpus['cases'])} cases to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Run the solver over the benchmark corpus and compare against a baseline.
+
+    python -m benchmarks.runner --output results.json
+    python -m benchmarks.runner --baseline benchmarks/baseline.json
+
+Every case is solved within a node budget, so slow cases are measured
+without stalling the run. Time is the best of ``--repeat`` runs, nodes come
+from the solver and peak memory from a separate ``tracemalloc`` run. With a
+baseline the run exits with status 1 when a case searched more nodes or used
+more memory than the threshold allows, or when its outcome changed. Wall
+time depends on the machine, so it is only compared with ``--compare-time``,
+against a baseline recorded on the same machine.
+"""
+
+import argparse
+import functools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.puzzle_solver import FieldState, PuzzleSolver
+
+from .corpus import CORPUS_VERSION, load_corpus
+
+# Solver configurations by name: keyword arguments of PuzzleSolver.
+CONFIGS: Dict[str, Dict[str, Any]] = {
+    "static": {},
+    "mrv": {"variable_order": "mrv"},
+    "lcv": {"value_order": "lcv"},
+    "mrv-lcv": {"variable_order": "mrv", "value_order": "lcv"},
+    "backjump": {"backjump": True},
+    "decompose": {"decompose": True},
+}
+
+MAX_NODES = 5000
+THRESHOLD = 0.25
+
+# Differences below these are noise whatever the threshold says.
+MIN_SECONDS = 0.005
+MIN_PEAK_KB = 64
+
+
+def solve_case(
+    rows: List[List[int]], config: Dict[str, Any], max_nodes: int
+) -> Tuple[str, int]:
+    """Solve a board once and return its outcome and the nodes searched."""
+    state = FieldState.from_list_to_state(rows).get("state")
+    if state is None:
+        return "invalid", 0
+    solver = PuzzleSolver(state, **config)
+    result = solver.solve(max_nodes=max_nodes)
+    if "solved_puzzle" in result:
+        return "solved", solver.nodes
+    return result.get("budget_exceeded") or "unsolvable", solver.nodes
+
+
+def measure(
+    solve: Callable[[], Tuple[str, int]], repeat: int, memory: bool
+) -> Dict[str, Any]:
+    """Measure the best time, the nodes and the peak memory of a solve."""
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        outcome, nodes = solve()
+        seconds.append(time.perf_counter() - started)
+    result = {"outcome": outcome, "nodes": nodes, "seconds": min(seconds)}
+    if memory:
+        tracemalloc.start()
+        try:
+            solve()
+            result["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run(
+    cases: List[Dict[str, Any]],
+    configs: List[str],
+    repeat: int = 3,
+    max_nodes: int = MAX_NODES,
+    memory: bool = True,
+) -> List[Dict[str, Any]]:
+    """Measure every case under every configuration."""
+    results = []
+    for config in configs:
+        for case in cases:
+            result = measure(
+                functools.partial(solve_case, case["rows"], CONFIGS[config], max_nodes),
+                repeat,
+                memory,
+            )
+            expected = case.get("expected")
+            if expected and result["outcome"] in ("solved", "unsolvable"):
+                result["correct"] = result["outcome"] == expected
+            results.append({"case": case["name"], "config": config, **result})
+    return results
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    threshold: float = THRESHOLD,
+    seconds: bool = False,
+) -> List[str]:
+    """Return the regressions of results against a baseline.
+
+    Wall time is only compared with ``seconds``.
+    """
+    fields: List[Tuple[str, float]] = [("nodes", 0), ("peak_kb", MIN_PEAK_KB)]
+    if seconds:
+        fields.insert(0, ("seconds", MIN_SECONDS))
+    previous = {(item["case"], item["config"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        key = (item["case"], item["config"])
+        name = f"{item['case']} [{item['config']}]"
+        if item.get("correct") is False:
+            regressions.append(f"{name}: wrong outcome {item['outcome']}")
+        if (old := previous.get(key)) is None:
+            continue
+        if item["outcome"] != old["outcome"]:
+            regressions.append(f"{name}: outcome {old['outcome']} -> {item['outcome']}")
+        regressions.extend(
+            f"{name}: {growth}" for growth in _growth(item, old, fields, threshold)
+        )
+    return regressions
+
+
+def _growth(
+    item: Dict[str, Any],
+    old: Dict[str, Any],
+    fields: List[Tuple[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Return the measurements of a result grown past the threshold."""
+    growth = []
+    for field, minimum in fields:
+        if field in item and field in old:
+            limit = max(old[field] * (1 + threshold), old[field] + minimum)
+            if item[field] > limit:
+                growth.append(f"{field} {old[field]:.4g} -> {item[field]:.4g}")
+    return growth
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=int, default=CORPUS_VERSION)
+    parser.add_argument(
+        "--config",
+        action="append",
+        choices=sorted(CONFIGS),
+        help="solver configuration to run, repeatable (default: static)",
+    )
+    parser.add_argument("--case", action="append", help="case name prefix")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-nodes", type=int, default=MAX_NODES)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against stored results")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "--compare-time",
+        action="store_true",
+        help="also compare wall time, against a baseline from this machine",
+    )
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    cases = [
+        case
+        for case in corpus["cases"]
+        if not args.case or any(case["name"].startswith(p) for p in args.case)
+    ]
+    results = run(
+        cases,
+        args.config or ["static"],
+        repeat=args.repeat,
+        max_nodes=args.max_nodes,
+        memory=not args.no_memory,
+    )
+    for item in results:
+        print(
+            f"{item['case']:<16} {item['config']:<8} {item['outcome']:<10} "
+            f"{item['seconds'] * 1000:>10.2f} ms {item['nodes']:>8} nodes "
+            f"{item.get('peak_kb', 0):>9.1f} KiB"
+        )
+    if args.output:
+        report = {
+            "corpus": corpus["version"],
+            "max_nodes": args.max_nodes,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=1)
+            file.write("\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if (baseline["corpus"], baseline["max_nodes"]) != (
+            corpus["version"],
+            args.max_nodes,
+        ):
+            print("Baseline is for another corpus or node budget", file=sys.stderr)
+            return 2
+        regressions = compare(
+            results, baseline["results"], args.threshold, args.compare_time
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())